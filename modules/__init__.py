@@ -1,8 +1,15 @@
 from __future__ import annotations
 
 from .debug_extension import LspJdtlsRefreshWorkspace
+from .idle_suspension import JdtlsResumeListener
 from .jdtls import EclipseJavaDevelopmentTools, plugin_loaded, plugin_unloaded
-from .jdtls_commands import JdtlsClearData, LspJdtlsBuildWorkspace
+from .jdtls_commands import (
+    JdtlsClearData,
+    JdtlsExportArtifactMirror,
+    JdtlsRollback,
+    JdtlsShowStartupTimeline,
+    LspJdtlsBuildWorkspace,
+)
 from .quick_input_panel import JdtlsInputCommand
 from .test_extension_commands import (
     LspJdtlsGenerateTests,
@@ -15,7 +22,11 @@ from .test_extension_commands import (
 __all__ = (
     "EclipseJavaDevelopmentTools",
     "JdtlsClearData",
+    "JdtlsExportArtifactMirror",
     "JdtlsInputCommand",
+    "JdtlsResumeListener",
+    "JdtlsRollback",
+    "JdtlsShowStartupTimeline",
     "LspJdtlsBuildWorkspace",
     "LspJdtlsGenerateTests",
     "LspJdtlsGotoTest",
@@ -0,0 +1,335 @@
+"""
+Persistent cache for downloaded install artifacts.
+
+Artifacts are stored content addressed by their SHA-256 and looked up by the url they were downloaded from.
+The cache survives re-installations, so switching between already downloaded versions does not need the network.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from http.client import HTTPException, IncompleteRead
+from typing import IO, TYPE_CHECKING, Callable, Iterator, TypedDict
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+from urllib.request import Request, url2pathname, urlopen
+
+if TYPE_CHECKING:
+    from http.client import HTTPResponse
+
+    ProgressCallback = Callable[[int, "int | None"], None]
+    """Called with the number of bytes downloaded so far and the total size, if known."""
+
+INDEX_FILENAME = "index.json"
+MIRROR_MANIFEST_FILENAME = "manifest.json"
+CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 30
+"""Seconds without any data after which a connection is considered dropped."""
+DOWNLOAD_RETRIES = 5
+"""Retries after consecutive failures without receiving any data before a download is given up."""
+DOWNLOAD_BACKOFF = 1.0
+"""Seconds to wait before the first retry, doubled for every following one."""
+
+
+class CacheEntry(TypedDict):
+    sha256: str
+    size: int
+    last_used: float
+
+
+class MirrorEntry(TypedDict):
+    file: str
+    """Path of the artifact relative to the mirror directory."""
+    sha256: str
+
+
+class MirrorManifest(TypedDict):
+    versions: dict[str, str]
+    """The component versions the mirror was created for. Informational only."""
+    artifacts: dict[str, MirrorEntry]
+    """Artifacts by the url they are downloaded from without a mirror."""
+
+
+def file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class DownloadError(OSError):
+    """Raised when a download did not complete after all retries. The partial download is kept for resuming."""
+
+
+class _ResumableDownload:
+    """
+    Readable stream of the content of `url` which is appended to `partial_file` and hashed while it is read.
+
+    Content which is already in `partial_file` from an earlier attempt is read from disk first
+    and only the rest is requested from the server with a HTTP Range request.
+    Dropped connections are resumed the same way, with an exponential backoff between the attempts.
+    """
+
+    def __init__(self, url: str, partial_file: str, progress: ProgressCallback | None) -> None:
+        self._url = url
+        self._progress = progress
+        self._local: IO[bytes] | None = open(partial_file, "rb") if os.path.exists(partial_file) else None
+        self._out_file = open(partial_file, "ab")
+        self._response: HTTPResponse | None = None
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.total: int | None = None
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._read_local(size)
+        if not chunk:
+            chunk = self._read_remote(size)
+            self._out_file.write(chunk)
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        if self._progress:
+            self._progress(self.size, self.total)
+        return chunk
+
+    def drain(self) -> None:
+        """Reads the rest of the content, e.g. the padding after the end of a tar stream."""
+        while self.read(CHUNK_SIZE):
+            pass
+
+    def close(self) -> None:
+        if self._local:
+            self._local.close()
+        if self._response:
+            self._response.close()
+        self._out_file.close()
+
+    def _read_local(self, size: int) -> bytes:
+        if not self._local:
+            return b""
+        chunk = self._local.read(size)
+        if not chunk:
+            self._local.close()
+            self._local = None
+        return chunk
+
+    def _read_remote(self, size: int) -> bytes:
+        attempt = 0
+        while True:
+            try:
+                if not self._response:
+                    self._response = self._connect()
+                chunk = self._response.read(size)
+                # http.client reports a connection closed before Content-Length as a short read.
+                if not chunk and self.total is not None and self.size < self.total:
+                    raise IncompleteRead(b"", self.total - self.size)
+                return chunk
+            except (OSError, HTTPException) as error:
+                if self._response:
+                    self._response.close()
+                    self._response = None
+                if isinstance(error, HTTPError) and error.code == 416 and self._is_complete(error):
+                    return b""
+                if isinstance(error, HTTPError) and error.code < 500:
+                    raise
+                if attempt >= DOWNLOAD_RETRIES:
+                    raise DownloadError(f"downloading {self._url} failed: {error}") from error
+                time.sleep(DOWNLOAD_BACKOFF * 2**attempt)
+                attempt += 1
+
+    def _connect(self) -> HTTPResponse:
+        headers = {"Range": f"bytes={self.size}-"} if self.size else {}
+        response: HTTPResponse = urlopen(Request(self._url, headers=headers), timeout=DOWNLOAD_TIMEOUT)
+        content_range = re.match(r"bytes \d+-\d+/(\d+)", response.headers.get("Content-Range", ""))
+        if response.status == 206 and content_range:
+            self.total = int(content_range.group(1))
+            return response
+        length = response.headers.get("Content-Length")
+        self.total = int(length) if length else None
+        # The server ignored the Range header, skip the content which was already read.
+        skip = self.size
+        while skip:
+            chunk = response.read(min(skip, CHUNK_SIZE))
+            if not chunk:
+                raise IncompleteRead(b"", skip)
+            skip -= len(chunk)
+        return response
+
+    def _is_complete(self, error: HTTPError) -> bool:
+        """Whether a 416 Range Not Satisfiable response is due to already having the whole content."""
+        content_range = re.match(r"bytes \*/(\d+)", error.headers.get("Content-Range", ""))
+        return bool(content_range) and int(content_range.group(1)) == self.size
+
+
+class ArtifactMirror:
+    """
+    A local directory, e.g. on a network share, which provides the artifacts instead of their public urls.
+    The directory contains a `manifest.json` (see `MirrorManifest`) next to the artifact files.
+    """
+
+    def __init__(self, location: str) -> None:
+        """`location` is either a directory path or a file:// url."""
+        if location.startswith("file:"):
+            location = url2pathname(urlparse(location).path)
+        self._path = os.path.expanduser(location)
+        try:
+            with open(os.path.join(self._path, MIRROR_MANIFEST_FILENAME), "r") as manifest:
+                self._manifest: MirrorManifest = json.load(manifest)
+        except (OSError, ValueError) as error:
+            raise OSError(f"{self._path} is not a valid artifact mirror: {error}") from error
+
+    def lookup(self, url: str) -> str:
+        """Returns the path to the verified mirrored content of `url`."""
+        entry = self._manifest["artifacts"].get(url)
+        if not entry:
+            raise OSError(f"{url} is not available in the artifact mirror {self._path}")
+        path = os.path.join(self._path, entry["file"])
+        if file_sha256(path) != entry["sha256"]:
+            raise OSError(f"{path} in the artifact mirror does not match its checksum")
+        return path
+
+
+def write_mirror(directory: str, artifacts: dict[str, str], versions: dict[str, str]) -> None:
+    """Creates an `ArtifactMirror` in `directory` from the files in `artifacts`, keyed by their url."""
+    os.makedirs(directory, exist_ok=True)
+    manifest: MirrorManifest = {"versions": versions, "artifacts": {}}
+    for url, path in artifacts.items():
+        sha256 = file_sha256(path)
+        shutil.copyfile(path, os.path.join(directory, sha256))
+        manifest["artifacts"][url] = {"file": sha256, "sha256": sha256}
+    with open(os.path.join(directory, MIRROR_MANIFEST_FILENAME), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+
+class ArtifactCache:
+    """
+    A size capped cache of downloaded files with least recently used eviction.
+    If a `mirror` is given, artifacts are read from it instead of being downloaded.
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, path: str, max_size: int, mirror: ArtifactMirror | None = None) -> None:
+        self._path = path
+        self._max_size = max_size
+        self._mirror = mirror
+        self._lock = threading.Lock()
+        self._entries: dict[str, CacheEntry] = {}
+        os.makedirs(self._path, exist_ok=True)
+        self._load_index()
+
+    def fetch(self, url: str, progress: ProgressCallback | None = None) -> str:
+        """
+        Returns the path to the verified cached content of `url` and downloads it if necessary.
+        The returned file must not be modified.
+        """
+        cached = self._lookup(url)
+        if cached:
+            return cached
+        if self._mirror:
+            return self._mirror.lookup(url)
+        with self._download(url, progress) as reader:
+            reader.drain()
+        return self._blob_path(reader.sha256.hexdigest())
+
+    @contextmanager
+    def open(self, url: str, progress: ProgressCallback | None = None) -> Iterator[IO[bytes] | _ResumableDownload]:
+        """
+        Opens the content of `url` for sequential reading.
+        On a cache miss the content is streamed from the network and added to the cache once it was read completely.
+        """
+        cached = self._lookup(url)
+        if not cached and self._mirror:
+            cached = self._mirror.lookup(url)
+        if cached:
+            with open(cached, "rb") as file:
+                yield file
+            return
+        with self._download(url, progress) as reader:
+            yield reader
+
+    @contextmanager
+    def _download(self, url: str, progress: ProgressCallback | None) -> Iterator[_ResumableDownload]:
+        # The partial file is named after the url, so an interrupted download is resumed by the next attempt.
+        partial_file = self._blob_path(hashlib.sha256(url.encode()).hexdigest() + ".part")
+        reader = _ResumableDownload(url, partial_file, progress)
+        try:
+            yield reader
+            reader.drain()
+            reader.close()
+            os.replace(partial_file, self._blob_path(reader.sha256.hexdigest()))
+        except DownloadError:
+            raise
+        except BaseException:
+            # Anything but a dropped connection may be caused by corrupt content, which must not be resumed.
+            reader.close()
+            if os.path.exists(partial_file):
+                os.remove(partial_file)
+            raise
+        finally:
+            reader.close()
+        with self._lock:
+            self._entries[url] = {"sha256": reader.sha256.hexdigest(), "size": reader.size, "last_used": time.time()}
+            self._save_index()
+
+    def _lookup(self, url: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(url)
+        if not entry:
+            return None
+        blob = self._blob_path(entry["sha256"])
+        if not os.path.isfile(blob) or file_sha256(blob) != entry["sha256"]:
+            with self._lock:
+                self._entries.pop(url, None)
+                self._remove_unreferenced_blob(entry["sha256"])
+                self._save_index()
+            return None
+        with self._lock:
+            entry["last_used"] = time.time()
+            self._save_index()
+        return blob
+
+    def trim(self) -> None:
+        """
+        Evicts the least recently used entries until the cache fits into its size limit.
+        Paths returned by `fetch` may be removed, so only call this once they are no longer used.
+        """
+        with self._lock:
+            total = sum(entry["size"] for entry in self._entries.values())
+            for url, entry in sorted(self._entries.items(), key=lambda item: item[1]["last_used"]):
+                if total <= self._max_size:
+                    break
+                del self._entries[url]
+                self._remove_unreferenced_blob(entry["sha256"])
+                total -= entry["size"]
+            self._save_index()
+
+    def _remove_unreferenced_blob(self, sha256: str) -> None:
+        if any(entry["sha256"] == sha256 for entry in self._entries.values()):
+            return
+        try:
+            os.remove(self._blob_path(sha256))
+        except FileNotFoundError:
+            pass
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self._path, sha256)
+
+    def _load_index(self) -> None:
+        try:
+            with open(os.path.join(self._path, INDEX_FILENAME), "r") as index:
+                self._entries = json.load(index)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def _save_index(self) -> None:
+        index_file = os.path.join(self._path, INDEX_FILENAME)
+        with open(index_file + ".tmp", "w") as index:
+            json.dump(self._entries, index)
+        os.replace(index_file + ".tmp", index_file)
@@ -0,0 +1,62 @@
+"""
+Application class data sharing (AppCDS) for the jdtls JVM.
+
+The first start with a new configuration is a training run which dumps the loaded classes
+into a dynamic archive when the JVM exits. Later starts map that archive instead of
+loading and verifying the classes of the OSGi bundles again.
+The archive is keyed by everything it depends on, so a changed configuration trains a new one.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+
+from . import jdk_probe
+
+ARCHIVE_DIR = "cds"
+"""Directory of the archives inside the jdtls install directory."""
+ARCHIVE_SUFFIX = ".jsa"
+
+_ARCHIVE_FLAGS = ("-XX:SharedArchiveFile=", "-XX:ArchiveClassesAtExit=")
+
+
+def archive_key(jdtls_path: str, bundles: list[str], java_executable: str, command: list[str]) -> str:
+    """
+    Identifies the classes an archive was created from, including the java agents of `command`.
+    The java executable is resolved and identified by its modification time, so an updated JDK in the same
+    location does not use an archive of the previous one.
+    """
+    java_path = jdk_probe.resolve(java_executable)
+    try:
+        java_mtime = os.stat(java_path).st_mtime
+    except OSError:
+        java_mtime = 0
+    agents = [arg for arg in command if arg.startswith("-javaagent:")]
+    identity = [jdtls_path, java_path, str(java_mtime)] + agents + sorted(bundles)
+    return hashlib.sha256("\n".join(identity).encode()).hexdigest()[:16]
+
+
+def apply_archive_flags(command: list[str], jdtls_path: str, key: str) -> bool:
+    """
+    Adds the flag to use the archive for `key` to `command`, or to create it at exit if it does not exist yet.
+    Archives of other keys are removed. Returns whether an existing archive is used.
+    """
+    archive_dir = os.path.join(jdtls_path, ARCHIVE_DIR)
+    os.makedirs(archive_dir, exist_ok=True)
+    archive = os.path.join(archive_dir, key + ARCHIVE_SUFFIX)
+    for name in os.listdir(archive_dir):
+        if name != key + ARCHIVE_SUFFIX:
+            try:
+                os.remove(os.path.join(archive_dir, name))
+            except OSError:
+                pass
+    remove_archive_flags(command)
+    exists = os.path.isfile(archive) and os.path.getsize(archive) > 0
+    flag = "-XX:SharedArchiveFile=" if exists else "-XX:ArchiveClassesAtExit="
+    command.insert(command.index("-jar"), flag + archive)
+    return exists
+
+
+def remove_archive_flags(command: list[str]) -> None:
+    command[:] = [arg for arg in command if not arg.startswith(_ARCHIVE_FLAGS)]
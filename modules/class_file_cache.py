@@ -0,0 +1,176 @@
+"""
+Persistent cache for the contents of `jdt:` documents, i.e. decompiled or attached sources of library classes.
+
+Entries are keyed by the `jdt:` URI, the identity (path, size, modification time) of the jar it points into
+and of its `-sources.jar` next to it, and the content provider which produces the text. So a rebuilt jar,
+an added or updated source attachment or another decompiler gives a new entry.
+Documents whose jar cannot be identified are not cached.
+The cache survives server restarts, least recently used entries are evicted once "classFileCache.maxSizeMB"
+is exceeded. Hits only update the index in memory, it is saved a while later.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import TypedDict
+from urllib.parse import unquote, urlparse
+
+import sublime
+
+from . import installer
+from .constants import CLASS_FILE_CACHE_DIR, CLASS_FILE_CACHE_MAX_SIZE_MB
+from .utils import get_settings
+
+INDEX_FILENAME = "index.json"
+INDEX_SAVE_DELAY_MS = 10000
+
+# The handle identifier in the query of a jdt: URI is "=<project>/<escaped path of the jar><package(<class>".
+_JAR_PATH = re.compile(r"^=[^/]*/((?:\\.|[^\\<`|=])+)")
+
+
+class CacheEntry(TypedDict):
+    size: int
+    last_used: float
+
+
+def jar_path(uri: str) -> str | None:
+    """The path of the jar a `jdt:` URI points into, None if it is not a jar."""
+    match = _JAR_PATH.match(unquote(urlparse(uri).query))
+    if not match:
+        return None
+    path = re.sub(r"\\(.)", r"\1", match.group(1))
+    return path if path.endswith((".jar", ".zip", ".jmod")) else None
+
+
+def sources_jar_path(path: str) -> str:
+    """The path of the source attachment of a jar in the layout of Maven repositories."""
+    return os.path.splitext(path)[0] + "-sources.jar"
+
+
+def _file_identity(path: str) -> list[str] | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [path, str(stat.st_size), str(stat.st_mtime)]
+
+
+def cache_key(uri: str, content_provider: str) -> str | None:
+    """The key of the contents of `uri` as produced by `content_provider`, None if its jar cannot be identified."""
+    path = jar_path(uri)
+    jar = _file_identity(path) if path else None
+    if not jar:
+        return None
+    sources = _file_identity(sources_jar_path(jar[0])) or ["no sources"]
+    identity = [uri, content_provider] + jar + sources
+    return hashlib.sha256("\n".join(identity).encode()).hexdigest()
+
+
+class ClassFileCache:
+    """
+    A size capped cache of document contents with least recently used eviction.
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, path: str, max_size: int) -> None:
+        self._path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: dict[str, CacheEntry] = {}
+        self._save_scheduled = False
+        os.makedirs(self._path, exist_ok=True)
+        self._load_index()
+
+    def get(self, key: str) -> str | None:
+        """The contents stored with a `cache_key`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            try:
+                with open(self._content_path(key), "r", encoding="utf-8") as file:
+                    contents = file.read()
+            except OSError:
+                del self._entries[key]
+                self._save_index()
+                return None
+            entry["last_used"] = time.time()
+            self._schedule_save()
+        return contents
+
+    def put(self, key: str, contents: str) -> None:
+        if not contents:
+            return
+        data = contents.encode("utf-8")
+        with self._lock:
+            content_file = self._content_path(key)
+            with open(content_file + ".tmp", "wb") as file:
+                file.write(data)
+            os.replace(content_file + ".tmp", content_file)
+            self._entries[key] = {"size": len(data), "last_used": time.time()}
+            self._trim()
+            self._save_index()
+
+    def _trim(self) -> None:
+        total = sum(entry["size"] for entry in self._entries.values())
+        for key, entry in sorted(self._entries.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_size:
+                break
+            del self._entries[key]
+            try:
+                os.remove(self._content_path(key))
+            except FileNotFoundError:
+                pass
+            total -= entry["size"]
+
+    def _content_path(self, key: str) -> str:
+        return os.path.join(self._path, key + ".java")
+
+    def _load_index(self) -> None:
+        try:
+            with open(os.path.join(self._path, INDEX_FILENAME), "r") as index:
+                self._entries = json.load(index)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def _schedule_save(self) -> None:
+        """Saves the index a while later, so a series of hits writes it once. Call with the lock held."""
+        if not self._save_scheduled:
+            self._save_scheduled = True
+            sublime.set_timeout_async(self._save_scheduled_index, INDEX_SAVE_DELAY_MS)
+
+    def _save_scheduled_index(self) -> None:
+        with self._lock:
+            if self._save_scheduled:
+                self._save_index()
+
+    def _save_index(self) -> None:
+        self._save_scheduled = False
+        index_file = os.path.join(self._path, INDEX_FILENAME)
+        with open(index_file + ".tmp", "w") as index:
+            json.dump(self._entries, index)
+        os.replace(index_file + ".tmp", index_file)
+
+
+_cache: ClassFileCache | None = None
+
+
+def class_file_cache() -> ClassFileCache | None:
+    """The cache with the configured size limit, None if it is disabled."""
+    global _cache
+    max_size_mb = get_settings().get("classFileCache.maxSizeMB")
+    if max_size_mb is None:
+        max_size_mb = CLASS_FILE_CACHE_MAX_SIZE_MB
+    if not max_size_mb:
+        return None
+    if not _cache:
+        path = os.path.join(installer.storage_subpath(), CLASS_FILE_CACHE_DIR)
+        _cache = ClassFileCache(path, max_size_mb * 1024 * 1024)
+    # A changed limit applies from the next stored entry on.
+    _cache.max_size = max_size_mb * 1024 * 1024
+    return _cache
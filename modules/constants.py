@@ -13,7 +13,9 @@ VSCODE_PLUGINS = {
     "vscode-java-test": {
         "url": "https://open-vsx.org/api/vscjava/vscode-java-test/{version}/file/vscjava.vscode-java-test-{version}.vsix",
         "version": "0.43.1",
-        "extension_path": "extension"
+        "extension_path": "extension",
+        # Files used besides the javaExtensions of the package.json, relative to the extension_path
+        "extra_files": ["server/com.microsoft.java.test.runner-jar-with-dependencies.jar"]
     },
     "vscode-java-decompiler": {  # https://github.com/dgileadi/vscode-java-decompiler/issues/17
         "url": "https://github.com/dgileadi/vscode-java-decompiler/archive/{version}.zip",
@@ -21,11 +23,25 @@ VSCODE_PLUGINS = {
         "extension_path": "vscode-java-decompiler-{version}"
     }
 }
+ARTIFACT_CACHE_MAX_SIZE_MB = 1024
+CACHE_DIR = "cache"
+CLASS_FILE_CACHE_DIR = "classfiles"
+CLASS_FILE_CACHE_MAX_SIZE_MB = 256
+CLASS_FILE_MEMORY_CACHE_SIZE = 50
 DATA_DIR = "data"
 INSTALL_DIR = "server"
+INSTALL_MANIFEST = "manifest.json"
+KEEP_PREVIOUS_VERSIONS = 1
+MAX_PARALLEL_DOWNLOADS = 5
+MIN_JAVA_VERSION = 21
+PREFETCH_DELAY = 30
 SESSION_NAME = "jdtls"
 SETTINGS_FILENAME = "LSP-jdtls.sublime-settings"
+SHARED_SERVER_DATA_KEY = "shared"
 STORAGE_DIR = "LSP-jdtls"
+SYNTAX_SERVER_DATA_DIR = "syntax"
+SYNTAX_SESSION_NAME = "jdtls-syntax"
+WORKSPACE_DATA_MAX_SIZE_MB = 4096
 
 SETTING_ENABLE_NULL_ANALYSIS = "java.compile.nullAnalysis.mode"
 SETTING_JAVA_HOME = "java.jdt.ls.java.home"
@@ -34,9 +50,14 @@ SETTING_LOMBOK_ENABLED = "java.jdt.ls.lombokSupport.enabled"
 SETTING_PROGRESS_REPORT_ENABLED = "java.progressReports.enabled"
 
 JDTLS_CONFIG_TO_SUBLIME_SETTING = {
-    "java.format.tabSize": "tab_size",
-    "java.format.insertSpaces": "translate_tabs_to_spaces"
+    "java.format.tabSize": ("tab_size", int),
+    "java.format.insertSpaces": ("translate_tabs_to_spaces", bool),
+    "editor.detectIndentation": ("detect_indentation", bool),
+    "files.insertFinalNewline": ("ensure_newline_at_eof_on_save", bool),
+    # Sublime Text 4 also accepts "none", "all" and "not_editing".
+    "files.trimTrailingWhitespace": ("trim_trailing_white_space_on_save", lambda value: value not in (False, "none")),
+    "files.eol": ("default_line_ending", lambda value: {"windows": "\r\n", "unix": "\n"}.get(value, "auto")),
 }
-""" Config dict for workspace/configuration requests. """
+""" Config dict for workspace/configuration requests: the view setting and a conversion of its value. """
 
 # fmt: on
@@ -0,0 +1,308 @@
+"""
+Chooses the decompiler of the vscode-java-decompiler bundle for `java/classFileContents` requests.
+
+The server uses the content provider named by "java.contentProvider.preferred". If that is one of the
+bundled decompilers, a request which takes longer than "decompiler.timeoutSeconds" is cancelled and sent again
+with the next decompiler, a late response of the cancelled one is still taken if it comes first.
+The average latency of every decompiler is remembered per jar, so later classes of the same jar start with
+the fastest one.
+
+The decompiler is switched with `workspace/didChangeConfiguration`, which applies to the whole server,
+so a request which needs another decompiler than the configured one waits until the requests in flight are
+answered. Requests for the configured decompiler, and all requests if no bundled decompiler is preferred,
+are sent right away. The latency of every decompiled class is appended to a log of the last
+`MAX_CLASS_SAMPLES` classes.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple, TypedDict
+
+import sublime
+from LSP.plugin import Notification, Request
+from LSP.plugin.core.views import text_document_identifier
+from LSP.protocol import TextDocumentIdentifier
+
+from . import installer
+from .class_file_cache import jar_path
+from .utils import get_settings
+
+if TYPE_CHECKING:
+    from LSP.plugin import Session
+    from LSP.protocol import DocumentUri
+
+DECOMPILERS = ["fernflower", "cfr", "procyon"]
+SETTING_PREFERRED = "java.contentProvider.preferred"
+STATS_FILENAME = "decompilers.json"
+CLASS_LOG_FILENAME = "decompiled_classes.jsonl"
+MAX_CLASS_SAMPLES = 500
+DEFAULT_TIMEOUT = 5.0
+
+
+class Latency(TypedDict):
+    average_ms: float
+    samples: int
+
+
+class ClassSample(TypedDict):
+    time: float
+    """Unix timestamp of the response."""
+    uri: str
+    """The `jdt:` URI without its query."""
+    jar: str | None
+    decompiler: str
+    ms: float
+    used: bool
+    """False if the response came after another decompiler answered."""
+
+
+class _Job(NamedTuple):
+    session: Session
+    uri: DocumentUri
+    on_result: Callable[[str], None]
+    on_error: Callable[[Any], None]
+
+
+_lock = threading.Lock()
+_jar_latencies: dict[str, dict[str, Latency]] | None = None
+"""Latency by decompiler by jar."""
+_class_log_lines: int | None = None
+
+
+def preferred_order(preferred: str, jar: str | None) -> list[str]:
+    """The decompilers to try, the fastest one known for `jar` first, otherwise `preferred`."""
+    order = [preferred] + [decompiler for decompiler in DECOMPILERS if decompiler != preferred]
+    latencies = _load_latencies().get(jar, {}) if jar else {}
+    if latencies:
+        # Untried decompilers keep their place after the tried ones.
+        order.sort(key=lambda decompiler: latencies.get(decompiler, {}).get("average_ms", float("inf")))
+    return order
+
+
+def content_provider(preferred: str, uri: str) -> str:
+    """The content provider the server is asked for the contents of `uri` first."""
+    if preferred not in DECOMPILERS:
+        return str(preferred)
+    return preferred_order(preferred, jar_path(uri))[0]
+
+
+def record(uri: str, jar: str | None, decompiler: str, ms: float, used: bool) -> None:
+    sample: ClassSample = {
+        "time": round(time.time(), 3),
+        "uri": uri.split("?")[0],
+        "jar": jar,
+        "decompiler": decompiler,
+        "ms": round(ms, 1),
+        "used": used,
+    }
+    with _lock:
+        _log_class_sample(sample)
+        if not jar:
+            return
+        latencies = _load_latencies().setdefault(jar, {})
+        latency = latencies.setdefault(decompiler, {"average_ms": ms, "samples": 0})
+        latency["samples"] += 1
+        latency["average_ms"] += (ms - latency["average_ms"]) / latency["samples"]
+        _save_latencies()
+
+
+def record_timeout(jar: str | None, decompiler: str, timeout_ms: float) -> None:
+    """Counts a timeout as the timeout, so the decompiler is not preferred until it proves faster."""
+    if not jar:
+        return
+    with _lock:
+        latencies = _load_latencies().setdefault(jar, {})
+        if decompiler not in latencies:
+            latencies[decompiler] = {"average_ms": timeout_ms, "samples": 0}
+            _save_latencies()
+
+
+class DecompilerStrategy:
+    """Sends the `java/classFileContents` requests of a session. Only use it in the async thread."""
+
+    def __init__(self) -> None:
+        self._current: str | None = None
+        """The decompiler the server was last configured with."""
+        self._waiting: deque[_Job] = deque()
+        """Requests which need another decompiler, in order."""
+        self._in_flight = 0
+        """Requests for bundled decompilers which are not answered yet."""
+
+    def request(
+        self,
+        session: Session,
+        uri: DocumentUri,
+        on_result: Callable[[str], None],
+        on_error: Callable[[Any], None],
+    ) -> None:
+        preferred = session.config.settings.get(SETTING_PREFERRED)
+        if preferred not in DECOMPILERS:
+            self._send(session, uri, on_result, on_error)
+            return
+        self._waiting.append(_Job(session, uri, on_result, on_error))
+        self._start_waiting()
+
+    def configuration_sent(self, settings: dict[str, Any] | None) -> None:
+        """Called for every `workspace/didChangeConfiguration`, e.g. after the user changed the settings."""
+        self._current = ((settings or {}).get("java") or {}).get("contentProvider", {}).get("preferred")
+
+    def _start_waiting(self) -> None:
+        """Starts the waiting requests in order, as long as they need no switch or nothing is in flight."""
+        while self._waiting:
+            job = self._waiting[0]
+            preferred = job.session.config.settings.get(SETTING_PREFERRED)
+            order = preferred_order(preferred, jar_path(job.uri)) if preferred in DECOMPILERS else []
+            if self._in_flight and order and order[0] != self._current:
+                return
+            self._waiting.popleft()
+            if not order:
+                # The preference changed while it was waiting.
+                self._send(job.session, job.uri, job.on_result, job.on_error)
+                continue
+            self._in_flight += 1
+            self._run(job, order)
+
+    def _run(self, job: _Job, order: list[str]) -> None:
+        session, uri = job.session, job.uri
+        done = False
+
+        def finish(callback: Callable[[Any], None], value: Any) -> None:
+            nonlocal done
+            if done:
+                return
+            done = True
+            self._in_flight -= 1
+            callback(value)
+            self._start_waiting()
+
+        jar = jar_path(uri)
+        timeout = get_settings().get("decompiler.timeoutSeconds")
+        if timeout is None:
+            timeout = DEFAULT_TIMEOUT
+        current = 0
+        cancelled: set[int] = set()
+
+        def start(index: int) -> None:
+            nonlocal current
+            current = index
+            decompiler = order[index]
+            start_time = time.perf_counter()
+            request_id: int | None = None
+
+            def result(contents: str) -> None:
+                record(uri, jar, decompiler, (time.perf_counter() - start_time) * 1000, not done)
+                finish(job.on_result, contents)
+
+            def error(err: Any) -> None:
+                if done or request_id in cancelled:
+                    return
+                if index + 1 < len(order):
+                    start(index + 1)
+                else:
+                    finish(job.on_error, err)
+
+            def check_timeout() -> None:
+                if done or current != index or index + 1 >= len(order):
+                    return
+                record_timeout(jar, decompiler, timeout * 1000)
+                print(f"LSP-jdtls: {decompiler} takes longer than {timeout}s, trying {order[index + 1]}")
+                if request_id is not None:
+                    cancelled.add(request_id)
+                    session.send_notification(Notification("$/cancelRequest", {"id": request_id}))
+                start(index + 1)
+
+            self._configure(session, decompiler)
+            request_id = self._send(session, uri, result, error)
+            # 0 waits for the preferred decompiler however long it takes.
+            if timeout:
+                sublime.set_timeout_async(check_timeout, int(timeout * 1000))
+
+        start(0)
+
+    def _configure(self, session: Session, decompiler: str) -> None:
+        """Makes the server use `decompiler` for the following requests."""
+        if decompiler == self._current:
+            return
+        settings = session.config.settings.copy()
+        settings.setdefault("java", {}).setdefault("contentProvider", {})["preferred"] = decompiler
+        session.send_notification(Notification("workspace/didChangeConfiguration", {"settings": settings}))
+        self._current = decompiler
+
+    def _send(
+        self,
+        session: Session,
+        uri: DocumentUri,
+        on_result: Callable[[str], None],
+        on_error: Callable[[Any], None],
+    ) -> int | None:
+        """Sends the request, returns its id."""
+        # https://github.com/redhat-developer/vscode-java/blob/9f32875a67352487f5c414bb7fef04c9b00af89d/src/protocol.ts#L105-L107
+        # https://github.com/redhat-developer/vscode-java/blob/9f32875a67352487f5c414bb7fef04c9b00af89d/src/providerDispatcher.ts#L61-L76
+        # https://github.com/redhat-developer/vscode-java/blob/9f32875a67352487f5c414bb7fef04c9b00af89d/src/providerDispatcher.ts#L27-L28
+        return session.send_request_async(
+            Request[TextDocumentIdentifier, str](
+                "java/classFileContents", text_document_identifier(uri), progress=True
+            ),
+            on_result,
+            on_error,
+        )
+
+
+def _stats_path() -> str:
+    return os.path.join(installer.storage_subpath(), STATS_FILENAME)
+
+
+def _load_latencies() -> dict[str, dict[str, Latency]]:
+    global _jar_latencies
+    if _jar_latencies is None:
+        try:
+            with open(_stats_path(), "r") as file:
+                _jar_latencies = json.load(file)
+        except (OSError, ValueError):
+            _jar_latencies = {}
+    return _jar_latencies  # type: ignore[return-value]
+
+
+def _class_log_path() -> str:
+    return os.path.join(installer.storage_subpath(), CLASS_LOG_FILENAME)
+
+
+def _log_class_sample(sample: ClassSample) -> None:
+    """Appends to the class log, which is cut to the last `MAX_CLASS_SAMPLES` once it has twice as many."""
+    global _class_log_lines
+    path = _class_log_path()
+    try:
+        if _class_log_lines is None:
+            try:
+                with open(path, "r") as log:
+                    _class_log_lines = sum(1 for _ in log)
+            except FileNotFoundError:
+                _class_log_lines = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as log:
+            log.write(json.dumps(sample) + "\n")
+        _class_log_lines += 1
+        if _class_log_lines > 2 * MAX_CLASS_SAMPLES:
+            with open(path, "r") as log:
+                lines = log.readlines()[-MAX_CLASS_SAMPLES:]
+            with open(path + ".tmp", "w") as log:
+                log.writelines(lines)
+            os.replace(path + ".tmp", path)
+            _class_log_lines = len(lines)
+    except OSError as ex:
+        print(f"LSP-jdtls: cannot log the decompiler latency: {ex}")
+
+
+def _save_latencies() -> None:
+    try:
+        os.makedirs(os.path.dirname(_stats_path()), exist_ok=True)
+        with open(_stats_path() + ".tmp", "w") as file:
+            json.dump(_jar_latencies, file)
+        os.replace(_stats_path() + ".tmp", _stats_path())
+    except OSError as ex:
+        print(f"LSP-jdtls: cannot save the decompiler latencies: {ex}")
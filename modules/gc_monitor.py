@@ -0,0 +1,252 @@
+"""
+Watches the heap of the server through its unified GC log.
+
+The server is started with `-Xlog:gc` writing to a file in its data directory, which is read incrementally.
+The heap occupancy after the last collection and the share of the time spent in GC pauses are shown in the
+config status. If both stay high, the server is thrashing near its maximum heap; depending on "gcMonitor",
+a restart with a larger heap is offered or performed.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import TYPE_CHECKING, NamedTuple
+
+import sublime
+
+from . import jvm_sizing, shared_server
+from .constants import SESSION_NAME
+from .protocol_extensions_handler import config_status_extras, update_config_status_async
+from .utils import get_settings
+
+if TYPE_CHECKING:
+    from weakref import ref
+
+    from LSP.plugin import Session
+
+GC_LOG_FILENAME = "gc.log"
+GC_LOG_OPTIONS = "uptime:filecount=1,filesize=10M"
+CHECK_INTERVAL_MS = 5000
+STATS_WINDOW = 60.0
+"""Seconds of server uptime the GC time ratio is computed over."""
+PRESSURE_OCCUPANCY = 0.85
+"""Share of the maximum heap which is still used after a collection."""
+PRESSURE_GC_RATIO = 0.15
+"""Share of the time spent in GC pauses."""
+PRESSURE_CHECKS = 12
+"""Consecutive checks above both thresholds after which the pressure counts as sustained."""
+HEAP_GROWTH = 1.5
+MAX_HEAP_RAM_FRACTION = 0.5
+
+# [12.345s] GC(42) Pause Young (Normal) (G1 Evacuation Pause) 150M->40M(256M) 5.123ms
+_GC_EVENT = re.compile(
+    r"^\[(?P<uptime>\d+(?:\.\d+)?)s\].*?GC\(\d+\) (?P<event>Pause \w+).*? "
+    r"(?P<before>\d+)(?P<before_unit>[KMG])->(?P<after>\d+)(?P<after_unit>[KMG])"
+    r"\((?P<capacity>\d+)(?P<capacity_unit>[KMG])\) (?P<pause>\d+(?:\.\d+)?)ms\s*$"
+)
+_UNITS_MB = {"K": 1 / 1024, "M": 1, "G": 1024}
+
+_heap_overrides: dict[int, int] = {}
+"""Maximum heap in MB by window, for restarts after heap pressure."""
+
+
+class GcEvent(NamedTuple):
+    uptime: float
+    """Seconds since the start of the JVM."""
+    event: str
+    before_mb: float
+    after_mb: float
+    capacity_mb: float
+    pause_ms: float
+
+
+def parse_line(line: str) -> GcEvent | None:
+    match = _GC_EVENT.match(line)
+    if not match:
+        return None
+    return GcEvent(
+        float(match.group("uptime")),
+        match.group("event"),
+        int(match.group("before")) * _UNITS_MB[match.group("before_unit")],
+        int(match.group("after")) * _UNITS_MB[match.group("after_unit")],
+        int(match.group("capacity")) * _UNITS_MB[match.group("capacity_unit")],
+        float(match.group("pause")),
+    )
+
+
+def log_flag(data_path: str) -> str:
+    path = os.path.join(data_path, GC_LOG_FILENAME)
+    if sublime.platform() == "windows":
+        # The colon of the drive would separate the options otherwise.
+        path = f'"{path}"'
+    return f"-Xlog:gc:file={path}:{GC_LOG_OPTIONS}"
+
+
+def enable_log(command: list[str], data_path: str) -> None:
+    disable_log(command)
+    command.insert(command.index("-jar"), log_flag(data_path))
+
+
+def disable_log(command: list[str]) -> None:
+    command[:] = [arg for arg in command if not arg.startswith("-Xlog:gc:file=")]
+
+
+def heap_override(window_id: int) -> int | None:
+    return _heap_overrides.get(window_id)
+
+
+def _restart_session(window: sublime.Window, view: sublime.View | None) -> None:
+    """Restarts the session of `window`, lsp_restart_server is a text command which is run on a Java view."""
+    if not view or not view.is_valid():
+        selector = get_settings().get("selector") or "source.java"
+        view = next((view for view in window.views() if view.match_selector(0, selector)), None)
+    if view:
+        view.run_command("lsp_restart_server", {"config_name": SESSION_NAME})
+
+
+class GcLogTail:
+    """Reads the events which were appended to a GC log since the last call. Rotated logs are read from the start."""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._offset = 0
+        self._partial = b""
+
+    def read_events(self) -> list[GcEvent]:
+        try:
+            size = os.path.getsize(self._path)
+            if size < self._offset:
+                self._offset = 0
+                self._partial = b""
+            with open(self._path, "rb") as log:
+                log.seek(self._offset)
+                data = log.read()
+        except OSError:
+            return []
+        self._offset += len(data)
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        events = (parse_line(line.decode("utf-8", "replace")) for line in lines)
+        return [event for event in events if event]
+
+
+class HeapStats(NamedTuple):
+    occupancy: float
+    """Heap used after the last collection as a share of the maximum heap."""
+    gc_ratio: float
+    """Share of the time spent in GC pauses during the last `STATS_WINDOW` seconds."""
+
+
+class HeapPressure:
+    def __init__(self, max_heap_mb: float | None) -> None:
+        self._max_heap_mb = max_heap_mb
+        self._events: list[GcEvent] = []
+
+    def add(self, events: list[GcEvent]) -> None:
+        self._events += events
+        if self._events:
+            start = self._events[-1].uptime - STATS_WINDOW
+            self._events = [event for event in self._events if event.uptime >= start]
+
+    def stats(self) -> HeapStats | None:
+        if not self._events:
+            return None
+        last = self._events[-1]
+        max_heap = self._max_heap_mb or last.capacity_mb
+        window_start = max(last.uptime - STATS_WINDOW, 0.0)
+        duration = max(last.uptime - window_start, 1.0)
+        pauses = sum(event.pause_ms for event in self._events) / 1000
+        return HeapStats(min(last.after_mb / max_heap, 1.0), min(pauses / duration, 1.0))
+
+
+class GcMonitor:
+    def __init__(self, weaksession: ref[Session], data_path: str, max_heap_mb: int | None) -> None:
+        self._weaksession = weaksession
+        self._tail = GcLogTail(os.path.join(data_path, GC_LOG_FILENAME))
+        self._pressure = HeapPressure(max_heap_mb)
+        self._max_heap_mb = max_heap_mb
+        self._pressured_checks = 0
+        self._handled = False
+        self.committed_heap_mb: float | None = None
+        """The heap size after the last collection, including the free part."""
+        sublime.set_timeout_async(self._check, CHECK_INTERVAL_MS)
+
+    def _check(self) -> None:
+        session = self._weaksession()
+        if not session:
+            return
+        events = self._tail.read_events()
+        if events:
+            self.committed_heap_mb = events[-1].capacity_mb
+        self._pressure.add(events)
+        stats = self._pressure.stats()
+        # Without new collections the server is idle, which is no pressure however full the heap is.
+        if stats and events:
+            window_id = session.window.id()
+            config_status_extras[window_id] = "heap {:.0%}, GC {:.0%}".format(stats.occupancy, stats.gc_ratio)
+            update_config_status_async(session)
+            if stats.occupancy >= PRESSURE_OCCUPANCY and stats.gc_ratio >= PRESSURE_GC_RATIO:
+                self._pressured_checks += 1
+            else:
+                self._pressured_checks = 0
+            if self._pressured_checks >= PRESSURE_CHECKS and not self._handled:
+                self._handled = True
+                self._on_sustained_pressure(session, stats)
+        sublime.set_timeout_async(self._check, CHECK_INTERVAL_MS)
+
+    def _on_sustained_pressure(self, session: Session, stats: HeapStats) -> None:
+        print(
+            "LSP-jdtls: heap pressure, {:.0%} of the heap is used after GC "
+            "and {:.0%} of the time is spent in GC".format(stats.occupancy, stats.gc_ratio)
+        )
+        new_heap_mb = self._larger_heap_mb()
+        window = session.window
+        if not new_heap_mb:
+            window.status_message("LSP-jdtls: the server is running out of memory, consider raising jvm.maxHeapMB")
+            return
+        mode = get_settings().get("gcMonitor")
+        view = next((session_view.view for session_view in session.session_views_async()), None)
+
+        def restart() -> None:
+            print(f"LSP-jdtls: restarting the server with a maximum heap of {new_heap_mb} MB")
+            if not get_settings().get("sharedServer"):
+                _heap_overrides[window.id()] = new_heap_mb
+                _restart_session(window, view)
+                return
+            # The JVM only restarts once the sessions of all windows restarted and connect to a new one.
+            shared_server.replace_shared_server()
+            for other in sublime.windows():
+                _heap_overrides[other.id()] = new_heap_mb
+                _restart_session(other, view if other == window else None)
+
+        if mode == "auto":
+            restart()
+        elif mode == "ask":
+
+            def ask() -> None:
+                if sublime.ok_cancel_dialog(
+                    "The Java language server spends {:.0%} of its time collecting garbage and is close "
+                    "to its maximum heap of {} MB.\n\nRestart it with {} MB?".format(
+                        stats.gc_ratio, self._max_heap_mb, new_heap_mb
+                    ),
+                    "Restart",
+                ):
+                    restart()
+
+            sublime.set_timeout(ask)
+        else:
+            window.status_message("LSP-jdtls: the server is running out of memory, consider raising jvm.maxHeapMB")
+
+    def _larger_heap_mb(self) -> int | None:
+        """The next maximum heap size within the memory limits, None if the heap cannot grow."""
+        if not self._max_heap_mb:
+            return None
+        limit = (jvm_sizing.physical_memory_mb() or 0) * MAX_HEAP_RAM_FRACTION
+        cap = get_settings().get("jvm.maxHeapMB")
+        if cap:
+            limit = min(limit, cap) if limit else cap
+        new_heap = int(-(-self._max_heap_mb * HEAP_GROWTH // 256) * 256)
+        if limit:
+            new_heap = min(new_heap, int(limit))
+        return new_heap if new_heap > self._max_heap_mb else None
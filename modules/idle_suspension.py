@@ -0,0 +1,97 @@
+"""
+Shuts down servers which were idle for "idleTimeoutMinutes" and starts them again when a Java view is activated.
+The data directory survives, so the resumed server starts from its warm index.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, Callable
+
+import sublime
+import sublime_plugin
+from typing_extensions import override
+
+from .constants import SESSION_NAME
+from .utils import get_settings
+
+if TYPE_CHECKING:
+    from weakref import ref
+
+    from LSP.plugin import Session
+
+CHECK_INTERVAL_MS = 60 * 1000
+
+_suspended_windows: set[int] = set()
+
+
+def _idle_timeout() -> float:
+    """The idle timeout in seconds, 0 if servers are never suspended."""
+    return (get_settings().get("idleTimeoutMinutes") or 0) * 60
+
+
+def server_starting(window_id: int) -> None:
+    """A server starts in the window, activating a Java view must not restart it."""
+    _suspended_windows.discard(window_id)
+
+
+class IdleTracker:
+    """
+    Ends the session once no message was exchanged with the server for the idle timeout.
+    Every request and notification, e.g. for opening, editing or hovering a Java file, counts as activity,
+    as well as the notifications of the server. The session is never ended while the server reports
+    work in progress, e.g. a project import.
+    """
+
+    def __init__(self, weaksession: ref[Session], heap_mb: Callable[[], float | None]) -> None:
+        """`heap_mb` returns the heap of the server in MB, if it is known."""
+        self._weaksession = weaksession
+        self._heap_mb = heap_mb
+        self._last_activity = time.monotonic()
+        self._work_in_progress: set[str] = set()
+        sublime.set_timeout_async(self._check, CHECK_INTERVAL_MS)
+
+    def touch(self) -> None:
+        self._last_activity = time.monotonic()
+
+    def progress(self, token: str, done: bool) -> None:
+        """Records the begin or the end of the work reported with `token`."""
+        self.touch()
+        if done:
+            self._work_in_progress.discard(token)
+        else:
+            self._work_in_progress.add(token)
+
+    def _check(self) -> None:
+        session = self._weaksession()
+        if not session:
+            return
+        timeout = _idle_timeout()
+        idle = time.monotonic() - self._last_activity
+        if not timeout or idle < timeout or self._work_in_progress:
+            sublime.set_timeout_async(self._check, CHECK_INTERVAL_MS)
+            return
+        heap_mb = self._heap_mb()
+        print(
+            "LSP-jdtls: shutting down the server after {} idle minutes{}, "
+            "it is restarted when a Java file is activated".format(
+                int(idle // 60), f", reclaiming about {heap_mb:.0f} MB of heap" if heap_mb else ""
+            )
+        )
+        _suspended_windows.add(session.window.id())
+        session.end_async()
+
+
+class JdtlsResumeListener(sublime_plugin.EventListener):
+    """Restarts the server of a window whose server was shut down for being idle."""
+
+    @override
+    def on_activated_async(self, view: sublime.View) -> None:
+        window = view.window()
+        if not window or window.id() not in _suspended_windows:
+            return
+        if not view.match_selector(0, get_settings().get("selector") or "source.java"):
+            return
+        _suspended_windows.discard(window.id())
+        print("LSP-jdtls: resuming the idle server")
+        view.run_command("lsp_restart_server", {"config_name": SESSION_NAME})
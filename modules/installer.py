@@ -1,96 +1,159 @@
 from __future__ import annotations
 
+import json
 import os
+import posixpath
+import re
 import shutil
 import stat
 import tarfile
 import tempfile
+import threading
+import time
 import zipfile
-from pathlib import Path
-from typing import Callable
-from urllib.request import urlopen
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator, TypedDict
 
 import sublime
 from LSP.plugin.core.constants import ST_STORAGE_PATH
+from typing_extensions import NotRequired
 
+from .artifact_cache import ArtifactCache, ArtifactMirror, write_mirror
 from .constants import (
+    ARTIFACT_CACHE_MAX_SIZE_MB,
+    CACHE_DIR,
     DATA_DIR,
     INSTALL_DIR,
+    INSTALL_MANIFEST,
     JDTLS_TAR_URL_FILE,
     JDTLS_URL,
     JDTLS_VERSION,
+    KEEP_PREVIOUS_VERSIONS,
     LOMBOK_URL,
     LOMBOK_VERSION,
+    MAX_PARALLEL_DOWNLOADS,
+    PREFETCH_DELAY,
     SETTINGS_FILENAME,
     STORAGE_DIR,
     VSCODE_PLUGINS,
 )
 
+if TYPE_CHECKING:
+    from .artifact_cache import ProgressCallback
+
 
 def _jdtls_version() -> str:
     version = sublime.load_settings(SETTINGS_FILENAME).get("version")
     return version or JDTLS_VERSION
 
 
+def _artifact_cache() -> ArtifactCache:
+    settings = sublime.load_settings(SETTINGS_FILENAME)
+    max_size_mb = settings.get("artifactCache.maxSizeMB")
+    if max_size_mb is None:
+        max_size_mb = ARTIFACT_CACHE_MAX_SIZE_MB
+    source = settings.get("artifactSource")
+    mirror = ArtifactMirror(source) if source else None
+    return ArtifactCache(artifact_cache_path(), max_size_mb * 1024 * 1024, mirror)
+
+
 # File Download / Extraction
 ############################
 
 
-def download_file(url: str, file_name: str) -> None:
-    with urlopen(url) as response, open(file_name, "wb") as out_file:
-        shutil.copyfileobj(response, out_file)
+def _copy_file_atomic(source: str, file_name: str) -> None:
+    """
+    Copies `source` next to `file_name` and renames it into place once complete,
+    so an interrupted copy never looks like an installed file.
+    """
+    partial_file = file_name + ".part"
+    try:
+        shutil.copyfile(source, partial_file)
+        os.replace(partial_file, file_name)
+    finally:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
 
 
-def _extract_file(
+@contextmanager
+def _staging_dir(path: str) -> Iterator[str]:
+    """
+    Yields an empty directory next to `path` which is renamed to `path` once the block completes.
+    Staging on the same file system makes the final rename cheap and atomic.
+    """
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix=".staging-")
+    os.chmod(staging, 0o755)
+    try:
+        yield staging
+        os.rename(staging, path)
+    finally:
+        if os.path.isdir(staging):
+            _rmtree(staging)
+
+
+def _rmtree(path: str) -> None:
+    # Make writable before delete due to issue with latest jdt-*.tar.gz:
+    # https://github.com/sublimelsp/LSP-jdtls/pull/58
+    def del_rw(action, name, exc):
+        os.chmod(name, stat.S_IWRITE)
+        os.remove(name)
+    shutil.rmtree(path, onerror=del_rw)
+
+
+def extract_zip(
+    cache: ArtifactCache,
     url: str,
     path: str,
-    open_function: Callable[[str], zipfile.ZipFile] | Callable[[str], tarfile.TarFile],
+    progress: ProgressCallback | None = None,
+    select_members: Callable[[zipfile.ZipFile], list[str] | None] | None = None,
 ) -> None:
-    with tempfile.TemporaryDirectory() as download_dir:
-        compressed_file = os.path.join(download_dir, "compressed_file")
-        download_file(url, compressed_file)
-        uncompress_dir = os.path.join(download_dir, "uncompress_dir")
-        os.makedirs(uncompress_dir)
-        with open_function(compressed_file) as compressed_file:
-            compressed_file.extractall(uncompress_dir)
-        # Make writable before delete due to issue with latest jdt-*.tar.gz:
-        # https://github.com/sublimelsp/LSP-jdtls/pull/58
-        _make_all_files_writable(uncompress_dir)
-        shutil.move(uncompress_dir, path)
-
-
-def _make_all_files_writable(root_dir: str) -> None:
-    """
-    Make's all files in folder writeable
-    """
-    for dirpath, _, filenames in os.walk(root_dir):
-        for filename in filenames:
-            path = Path(dirpath) / filename
-            try:
-                # Skip if already writable
-                if os.access(path, os.W_OK):
-                    continue
-                # Add user write bit
-                new_mode = path.stat().st_mode | stat.S_IWRITE
-                os.chmod(path, new_mode)
-            except Exception as e:
-                print(f"Failed on {path}: {e}")
-
-
-def extract_zip(url: str, path: str) -> None:
     """
     Extracts the zip at `url` to `path`.
-    The zip is extracted into `path` if it already exists.
+    The zip is read from the artifact cache as its central directory is at the end of the file.
+    `select_members` may return the names of the only members to extract, or None to extract all.
     """
-    _extract_file(url, path, lambda x: zipfile.ZipFile(x, "r"))
+    compressed_file = cache.fetch(url, progress)
+    with _staging_dir(path) as staging, zipfile.ZipFile(compressed_file, "r") as zip_file:
+        zip_file.extractall(staging, select_members(zip_file) if select_members else None)
 
 
-def extract_tar(url: str, path: str) -> None:
+def _vscode_plugin_members(plugin_name: str, version: str, zip_file: zipfile.ZipFile) -> list[str] | None:
+    """
+    The package.json and the jars of a VSIX which are used by LSP-jdtls.
+    Webviews, node modules, images etc. are skipped.
+    """
+    plugin = VSCODE_PLUGINS[plugin_name]
+    extension_path = plugin["extension_path"].format(version=version)
+    package_json = posixpath.join(extension_path, "package.json")
+    try:
+        jars = json.loads(zip_file.read(package_json)).get("contributes", {}).get("javaExtensions", [])
+    except (KeyError, ValueError):
+        # Unexpected layout, better extract everything
+        return None
+    names = set(zip_file.namelist())
+    members = [package_json]
+    for file in jars + plugin.get("extra_files", []):
+        member = posixpath.normpath(posixpath.join(extension_path, file))
+        if member in names:
+            members.append(member)
+    return members
+
+
+def extract_tar(cache: ArtifactCache, url: str, path: str, progress: ProgressCallback | None = None) -> None:
     """
     Extracts the tar at `url` to `path`.
-    The tar is extracted into `path` if it already exists.
+    The tar is extracted while it is downloaded, without an intermediate copy of the archive.
     """
-    _extract_file(url, path, lambda x: tarfile.open(x, "r:gz"))
+    with _staging_dir(path) as staging, cache.open(url, progress) as stream:
+        with tarfile.open(fileobj=stream, mode="r|gz") as tar_file:  # type: ignore
+            for member in tar_file:
+                # Make writable before delete due to issue with latest jdt-*.tar.gz:
+                # https://github.com/sublimelsp/LSP-jdtls/pull/58
+                member.mode |= stat.S_IRWXU if member.isdir() else stat.S_IRUSR | stat.S_IWUSR
+                tar_file.extract(member, staging)
 
 
 # Path definitions
@@ -105,64 +168,527 @@ def install_path() -> str:
     return os.path.join(storage_subpath(), INSTALL_DIR)
 
 
-def jdtls_path() -> str:
-    return os.path.join(install_path(), f"jdtls-{_jdtls_version()}")
+def jdtls_path(version: str | None = None) -> str:
+    return os.path.join(install_path(), f"jdtls-{version or _active_versions()['jdtls']}")
 
 
 def jdtls_data_path() -> str:
     return os.path.join(storage_subpath(), DATA_DIR)
 
 
-def vscode_plugin_path(plugin_name: str) -> str:
-    plugin = VSCODE_PLUGINS[plugin_name]
+def artifact_cache_path() -> str:
+    return os.path.join(storage_subpath(), CACHE_DIR)
+
+
+def vscode_plugin_path(plugin_name: str, version: str | None = None) -> str:
     return os.path.join(
         install_path(),
-        "{name}-{version}".format(name=plugin_name, version=plugin["version"]),
+        "{name}-{version}".format(name=plugin_name, version=version or _active_versions()[plugin_name]),
     )
 
 
-def vscode_plugin_extension_path(plugin_name: str) -> str:
+def vscode_plugin_extension_path(plugin_name: str, version: str | None = None) -> str:
     """Path to the folder containing the package.json"""
     plugin = VSCODE_PLUGINS[plugin_name]
-    subpath = plugin["extension_path"].format(version=plugin["version"])
-    return os.path.normpath(os.path.join(vscode_plugin_path(plugin_name), subpath))
+    version = version or _active_versions()[plugin_name]
+    subpath = plugin["extension_path"].format(version=version)
+    return os.path.normpath(os.path.join(vscode_plugin_path(plugin_name, version), subpath))
+
+
+def lombok_jar_path(version: str | None = None) -> str:
+    return os.path.join(install_path(), f"lombok-{version or _active_versions()['lombok']}.jar")
 
 
-def lombok_jar_path() -> str:
-    return os.path.join(install_path(), f"lombok-{LOMBOK_VERSION}.jar")
+def install_manifest_path() -> str:
+    return os.path.join(install_path(), INSTALL_MANIFEST)
 
 
 # Install / Update
 ###################
 
 
+_manifest_lock = threading.Lock()
+
+
+def _required_versions() -> dict[str, str]:
+    """The version of every component the current settings require."""
+    versions = {"jdtls": _jdtls_version(), "lombok": LOMBOK_VERSION}
+    for plugin_name, plugin in VSCODE_PLUGINS.items():
+        versions[plugin_name] = plugin["version"]
+    return versions
+
+
+def _component_path(name: str, version: str) -> str:
+    if name == "jdtls":
+        return jdtls_path(version)
+    if name == "lombok":
+        return lombok_jar_path(version)
+    return vscode_plugin_path(name, version)
+
+
+class LaunchManifest(TypedDict):
+    components: dict[str, str]
+    """The component versions the launch configuration was resolved for."""
+    launcher_version: str
+    bundles: list[str]
+    """Absolute paths of the jdtls extension bundles."""
+
+
+class InstallManifest(TypedDict):
+    components: dict[str, str]
+    """The active component versions."""
+    launch: NotRequired[LaunchManifest]
+    history: NotRequired[list[dict[str, str]]]
+    """Previously active component versions which are kept for a rollback, most recent first."""
+    rollback_of: NotRequired[dict[str, str]]
+    """The required versions at the time of a rollback. The rollback is kept until they change."""
+    staged: NotRequired[dict[str, str]]
+    """Versions which were installed in the background and are activated by the next start."""
+
+
+def _read_manifest() -> InstallManifest:
+    try:
+        with open(install_manifest_path(), "r") as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return {"components": {}}
+
+
+def _write_manifest(manifest: InstallManifest) -> None:
+    manifest_file = install_manifest_path()
+    with open(manifest_file + ".tmp", "w") as manifest_tmp:
+        json.dump(manifest, manifest_tmp, indent=2)
+    os.replace(manifest_file + ".tmp", manifest_file)
+
+
+def _installed_versions() -> dict[str, str]:
+    """The version of every component recorded in the install manifest."""
+    return _read_manifest()["components"]
+
+
+def _active_versions() -> dict[str, str]:
+    """The component versions the server is started with."""
+    versions = _required_versions()
+    versions.update(_installed_versions())
+    return versions
+
+
+def _target_versions(manifest: InstallManifest) -> dict[str, str]:
+    """The component versions which should be active."""
+    required = _required_versions()
+    if manifest.get("rollback_of") == required:
+        return manifest["components"]
+    return required
+
+
+def _outdated_components() -> dict[str, str]:
+    """The components which need to be installed, mapped to the target version."""
+    manifest = _read_manifest()
+    installed = manifest["components"]
+    return {
+        name: version
+        for name, version in _target_versions(manifest).items()
+        if installed.get(name) != version or not os.path.exists(_component_path(name, version))
+    }
+
+
 def needs_update_or_installation() -> bool:
-    result = not os.path.isdir(jdtls_path())
-    result |= not os.path.isfile(lombok_jar_path())
+    return bool(_outdated_components())
+
+
+def _resolve_launcher_version(jdtls_dir: str) -> str:
+    launcher_version = ""
+    for file in os.listdir(os.path.join(jdtls_dir, "plugins")):
+        match = re.search("org.eclipse.equinox.launcher_(.*).jar", file)
+        if match:
+            launcher_version = match.group(1)
+    return launcher_version
+
+
+def _resolve_bundles(versions: dict[str, str]) -> list[str]:
+    bundles = []
     for plugin in VSCODE_PLUGINS:
-        result |= not os.path.isdir(vscode_plugin_path(plugin))
-    return result
+        ext_path = vscode_plugin_extension_path(plugin, versions[plugin])
+        with open(os.path.join(ext_path, "package.json"), "r") as package_json:
+            jars = (
+                json.load(package_json)
+                .get("contributes", {})
+                .get("javaExtensions", [])
+            )
+            for jar in jars:
+                abspath = os.path.abspath(
+                    os.path.normpath(os.path.join(ext_path, jar))
+                )
+                if abspath not in bundles:
+                    bundles.append(abspath)
+    return bundles
+
+
+def _resolve_launch(versions: dict[str, str]) -> LaunchManifest:
+    return {
+        "components": versions,
+        "launcher_version": _resolve_launcher_version(jdtls_path(versions["jdtls"])),
+        "bundles": _resolve_bundles(versions),
+    }
+
+
+def launch_manifest() -> LaunchManifest:
+    """
+    The launcher version and bundles of the installed server.
+    They are resolved once at install time; the install directory is only scanned again
+    if the stored result is missing or does not match the installed components.
+    """
+    versions = _active_versions()
+    launch = _read_manifest().get("launch")
+    if (
+        launch
+        and launch["components"] == versions
+        and os.path.isfile(
+            os.path.join(jdtls_path(), "plugins", f"org.eclipse.equinox.launcher_{launch['launcher_version']}.jar")
+        )
+    ):
+        return launch
+    launch = _resolve_launch(versions)
+    with _manifest_lock:
+        manifest = _read_manifest()
+        manifest["launch"] = launch
+        _write_manifest(manifest)
+    return launch
+
+
+class _InstallProgress:
+    """
+    Combines the progress of concurrently installed components into a single status message.
+    """
+
+    UPDATE_INTERVAL = 0.25
+
+    def __init__(self, names: list[str]) -> None:
+        self._lock = threading.Lock()
+        self._pending = list(names)
+        self._total = len(names)
+        self._downloaded: dict[str, tuple[int, int | None]] = {}
+        self._start_time = time.monotonic()
+        self._last_update = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            self._show()
+
+    def reporter(self, name: str) -> ProgressCallback:
+        def report(size: int, total: int | None) -> None:
+            with self._lock:
+                self._downloaded[name] = (size, total)
+                if time.monotonic() - self._last_update >= self.UPDATE_INTERVAL:
+                    self._show()
+
+        return report
+
+    def done(self, name: str) -> None:
+        with self._lock:
+            self._pending.remove(name)
+            self._show()
+
+    def _show(self) -> None:
+        self._last_update = time.monotonic()
+        if not self._pending:
+            sublime.status_message("LSP-jdtls: downloaded {total} components".format(total=self._total))
+            return
+        message = "LSP-jdtls: downloading {done}/{total}".format(
+            done=self._total - len(self._pending), total=self._total
+        )
+        if self._downloaded:
+            size = sum(size for size, _ in self._downloaded.values())
+            total = sum(total or size for size, total in self._downloaded.values())
+            rate = size / max(self._last_update - self._start_time, 0.001)
+            message += ", {size:.1f}/{total:.1f} MB at {rate:.1f} MB/s".format(
+                size=size / 1e6, total=total / 1e6, rate=rate / 1e6
+            )
+        sublime.status_message(message + " ({pending})...".format(pending=", ".join(self._pending)))
+
+
+def _run_parallel(
+    jobs: dict[str, Callable[[ProgressCallback], None]], max_workers: int = MAX_PARALLEL_DOWNLOADS
+) -> None:
+    """
+    Runs all `jobs` in a bounded thread pool.
+    If any job fails, jobs which did not start yet are cancelled and the first error is raised
+    once the running ones are finished.
+    """
+    if not jobs:
+        return
+    progress = _InstallProgress(list(jobs))
+    progress.start()
+
+    def run(name: str, job: Callable[[ProgressCallback], None]) -> None:
+        job(progress.reporter(name))
+        progress.done(name)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+        futures = {executor.submit(run, name, job): name for name, job in jobs.items()}
+        finished, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in pending:
+            future.cancel()
+        wait(pending)
+        for future in finished:
+            error = future.exception()
+            if error:
+                raise RuntimeError(f"LSP-jdtls: failed to install {futures[future]}: {error}") from error
+
+
+def _jdtls_url(cache: ArtifactCache, version: str) -> str:
+    # The latest.txt of a milestone never changes, so it is cached like the archives.
+    with open(cache.fetch(JDTLS_TAR_URL_FILE.format(version=version)), "r") as latest:
+        tar = latest.read().rstrip()
+    return JDTLS_URL.format(version=version, tar=tar)
+
+
+def _component_urls(cache: ArtifactCache, name: str, version: str) -> list[str]:
+    """All urls which are downloaded to install the component."""
+    if name == "jdtls":
+        return [JDTLS_TAR_URL_FILE.format(version=version), _jdtls_url(cache, version)]
+    if name == "lombok":
+        return [LOMBOK_URL.format(version=version)]
+    return [VSCODE_PLUGINS[name]["url"].format(version=version)]
+
+
+def _install_jdtls(cache: ArtifactCache, version: str, progress: ProgressCallback) -> None:
+    extract_tar(cache, _jdtls_url(cache, version), jdtls_path(version), progress)
+
+
+def _install_lombok(cache: ArtifactCache, version: str, progress: ProgressCallback) -> None:
+    _copy_file_atomic(cache.fetch(LOMBOK_URL.format(version=version), progress), lombok_jar_path(version))
+
+
+def _install_vscode_plugin(cache: ArtifactCache, plugin_name: str, version: str, progress: ProgressCallback) -> None:
+    plugin = VSCODE_PLUGINS[plugin_name]
+    extract_zip(
+        cache,
+        plugin["url"].format(version=version),
+        vscode_plugin_path(plugin_name, version),
+        progress,
+        lambda zip_file: _vscode_plugin_members(plugin_name, version, zip_file),
+    )
+
+
+def _install_component(cache: ArtifactCache, name: str, version: str, progress: ProgressCallback) -> None:
+    # Components are moved into place atomically, so an existing path is a complete install.
+    if not os.path.exists(_component_path(name, version)):
+        if name == "jdtls":
+            _install_jdtls(cache, version, progress)
+        elif name == "lombok":
+            _install_lombok(cache, version, progress)
+        else:
+            _install_vscode_plugin(cache, name, version, progress)
+
+
+def _verify(versions: dict[str, str]) -> LaunchManifest:
+    """Checks that the components are complete and resolves their launch configuration."""
+    try:
+        launch = _resolve_launch(versions)
+    except OSError as e:
+        raise RuntimeError(f"LSP-jdtls: the installed server is incomplete: {e}") from e
+    launcher_jar = os.path.join(
+        jdtls_path(versions["jdtls"]), "plugins", f"org.eclipse.equinox.launcher_{launch['launcher_version']}.jar"
+    )
+    for path in [launcher_jar, lombok_jar_path(versions["lombok"])] + launch["bundles"]:
+        if not os.path.isfile(path):
+            raise RuntimeError(f"LSP-jdtls: the installed server is incomplete, {path} is missing")
+    return launch
+
+
+def _is_complete(versions: dict[str, str]) -> bool:
+    if not versions:
+        return False
+    try:
+        _verify(versions)
+    except RuntimeError:
+        return False
+    return True
+
+
+def _keep_previous_versions() -> int:
+    keep = sublime.load_settings(SETTINGS_FILENAME).get("keepPreviousVersions")
+    return KEEP_PREVIOUS_VERSIONS if keep is None else keep
+
+
+def _activate(versions: dict[str, str], launch: LaunchManifest) -> None:
+    """
+    Switches the active install to `versions` by atomically replacing the install manifest.
+    The previously active versions are kept for a rollback.
+    """
+    with _manifest_lock:
+        manifest = _read_manifest()
+        history = manifest.get("history", [])
+        previous = manifest["components"]
+        if previous and previous != versions:
+            history = [previous] + [h for h in history if h != previous]
+        new_manifest: InstallManifest = {
+            "components": versions,
+            "launch": launch,
+            "history": [h for h in history if h != versions][: _keep_previous_versions()],
+        }
+        if manifest.get("rollback_of") and versions == manifest["components"]:
+            new_manifest["rollback_of"] = manifest["rollback_of"]
+        if manifest.get("staged") and manifest["staged"] != versions:
+            new_manifest["staged"] = manifest["staged"]
+        _write_manifest(new_manifest)
+
+
+def rollback() -> dict[str, str] | None:
+    """
+    Switches back to the most recent previously active versions, without downloading anything.
+    The rollback is kept until the required versions change.
+    Returns the versions switched to, or None if no previous versions are kept.
+    """
+    with _manifest_lock:
+        manifest = _read_manifest()
+        history = manifest.get("history", [])
+        if not history:
+            return None
+        versions = history[0]
+        new_manifest: InstallManifest = {
+            "components": versions,
+            "launch": _verify(versions),
+            "history": [manifest["components"]] + history[1:],
+            "rollback_of": _required_versions(),
+        }
+        if manifest.get("staged"):
+            new_manifest["staged"] = manifest["staged"]
+        _write_manifest(new_manifest)
+    return versions
+
+
+_components_in_use: dict[str, dict[str, str]] = {}
+"""The component versions of the running servers by an owner id."""
+
+
+def acquire_components(owner: str) -> None:
+    """Keeps the active component versions on disk until `release_components`, for a server starting with them."""
+    _components_in_use[owner] = _active_versions()
+
+
+def release_components(owner: str) -> None:
+    _components_in_use.pop(owner, None)
+
+
+def _remove_unused_components() -> None:
+    """
+    Removes everything from the install directory that is neither referenced by the install manifest
+    nor used by a running server.
+    """
+    manifest = _read_manifest()
+    used = {
+        _component_path(name, version)
+        for versions in [manifest["components"], manifest.get("staged", {})]
+        + manifest.get("history", [])
+        + list(_components_in_use.values())
+        for name, version in versions.items()
+    }
+    used.add(install_manifest_path())
+    for entry in os.listdir(install_path()):
+        path = os.path.join(install_path(), entry)
+        # Dot files are in-progress staging directories and temporary files.
+        if entry.startswith(".") or path in used:
+            continue
+        if os.path.isdir(path):
+            _rmtree(path)
+        else:
+            os.remove(path)
+
+
+_install_lock = threading.Lock()
+"""Serializes installs with background prefetches."""
+
+
+def _install_jobs(cache: ArtifactCache) -> dict[str, Callable[[ProgressCallback], None]]:
+    return {
+        name: lambda progress, name=name, version=version: _install_component(cache, name, version, progress)
+        for name, version in _outdated_components().items()
+    }
 
 
 def install_or_update() -> None:
-    version = _jdtls_version()
-    basedir = storage_subpath()
-    if os.path.isdir(basedir):
-        # Make writable before delete due to issue with latest jdt-*.tar.gz:
-        # https://github.com/sublimelsp/LSP-jdtls/pull/58
-        def del_rw(action, name, exc):
-            os.chmod(name, stat.S_IWRITE)
-            os.remove(name)
-        shutil.rmtree(basedir, onerror=del_rw)
-    os.makedirs(basedir)
-
-    # fmt: off
-    sublime.status_message("LSP-jdtls: downloading jdtls...")
-    with urlopen(JDTLS_TAR_URL_FILE.format(version=version)) as latest:
-        extract_tar(JDTLS_URL.format(version=version, tar=latest.read().decode().rstrip()), jdtls_path())
-    sublime.status_message("LSP-jdtls: downloading lombok...")
-    download_file(LOMBOK_URL.format(version=LOMBOK_VERSION), lombok_jar_path())
-    for plugin_name, plugin in VSCODE_PLUGINS.items():
-        sublime.status_message(f"LSP-jdtls: downloading {plugin_name}...")
-        extract_zip(plugin["url"].format(version=plugin["version"]), vscode_plugin_path(plugin_name))
-    # fmt: on
+    """
+    Installs the components whose version changed next to the active ones
+    and switches to them once they are verified.
+    If anything fails, the previously active install keeps working.
+    Other components and the server data directory are not touched.
+    """
+    with _install_lock:
+        os.makedirs(install_path(), exist_ok=True)
+        cache = _artifact_cache()
+        manifest = _read_manifest()
+        versions = _target_versions(manifest)
+        try:
+            # Components which were prefetched in the background already exist and are not downloaded again.
+            _run_parallel(_install_jobs(cache))
+            _activate(versions, _verify(versions))
+        except Exception as e:
+            if not _is_complete(manifest["components"]):
+                raise
+            print(f"LSP-jdtls: updating the server failed, starting the installed version: {e}")
+            sublime.status_message("LSP-jdtls: updating the server failed, see the console")
+        finally:
+            cache.trim()
+            _remove_unused_components()
+
+
+_prefetch_scheduled = False
+
+
+def prefetch_async() -> None:
+    """
+    Downloads and extracts changed component versions in a background thread while the active server keeps running.
+    They are only activated by the next `install_or_update`, i.e. the next server start, which then needs no network.
+    Does nothing before the first install, which happens on the first start anyway.
+    """
+    global _prefetch_scheduled
+    if _prefetch_scheduled or not sublime.load_settings(SETTINGS_FILENAME).get("prefetchUpdates", True):
+        return
+    _prefetch_scheduled = True
+    threading.Thread(target=_prefetch, name="LSP-jdtls prefetch", daemon=True).start()
+
+
+def _prefetch() -> None:
+    global _prefetch_scheduled
+    # Low priority: let a starting server go first and download one component at a time.
+    time.sleep(PREFETCH_DELAY)
+    _prefetch_scheduled = False
+    if not _install_lock.acquire(blocking=False):
+        return
+    try:
+        manifest = _read_manifest()
+        if not manifest["components"] or not _outdated_components():
+            return
+        versions = _target_versions(manifest)
+        cache = _artifact_cache()
+        try:
+            _run_parallel(_install_jobs(cache), max_workers=1)
+            _verify(versions)
+        finally:
+            cache.trim()
+        with _manifest_lock:
+            manifest = _read_manifest()
+            manifest["staged"] = versions
+            _write_manifest(manifest)
+        print("LSP-jdtls: prefetched jdtls {}, it is used after the next server restart".format(versions["jdtls"]))
+    except Exception as e:
+        print(f"LSP-jdtls: prefetching the server update failed: {e}")
+    finally:
+        _install_lock.release()
+
+
+def export_mirror(directory: str) -> None:
+    """
+    Writes an artifact mirror with everything the current settings require to `directory`.
+    Machines without internet access can install from a copy of it by setting `artifactSource`.
+    """
+    cache = _artifact_cache()
+    versions = _required_versions()
+    artifacts = {
+        url: cache.fetch(url)
+        for name, version in versions.items()
+        for url in _component_urls(cache, name, version)
+    }
+    write_mirror(directory, artifacts, versions)
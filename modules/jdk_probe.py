@@ -0,0 +1,185 @@
+"""
+Identifies the JDKs the server can run on.
+
+Probing runs `java -XshowSettings:properties -version`, which takes a moment, so the results are cached
+in memory and in a file, keyed by the resolved executable and its modification time.
+A replaced or updated JDK is probed again.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+from typing import NamedTuple
+
+import sublime
+
+from . import installer
+from .constants import MIN_JAVA_VERSION
+
+CACHE_FILENAME = "jdk_probes.json"
+PROBE_TIMEOUT = 15
+SETTING_RUNTIMES = "java.configuration.runtimes"
+
+_PROPERTY = re.compile(r"^\s+([\w.]+) = (.*)$")
+
+_lock = threading.Lock()
+_cache: dict[str, JdkInfo] | None = None
+
+
+class JdkInfo(NamedTuple):
+    version: int
+    """The feature version, e.g. 21."""
+    version_string: str
+    vendor: str
+    arch: str
+    class_data_sharing: bool
+    """Whether the JVM can create and use dynamic class data sharing archives."""
+
+    def describe(self) -> str:
+        return f"{self.vendor} {self.version_string} ({self.arch})"
+
+
+def resolve(java_executable: str) -> str:
+    """The real path of `java_executable`, which may be a command on the PATH or lack the ".exe" on Windows."""
+    found = shutil.which(java_executable)
+    directory, name = os.path.split(java_executable)
+    if not found and directory:
+        # Before Python 3.12, which() only tries the extensions of PATHEXT for names without a directory.
+        found = shutil.which(name, path=directory)
+    return os.path.realpath(found or java_executable)
+
+
+def probe(java_executable: str) -> JdkInfo | None:
+    """Identifies the JDK of `java_executable`, None if it cannot be run."""
+    path = resolve(java_executable)
+    try:
+        key = f"{path}:{os.stat(path).st_mtime}"
+    except OSError:
+        return None
+    with _lock:
+        cache = _load_cache()
+        if key in cache:
+            return cache[key]
+    info = _run_probe(path)
+    if info:
+        with _lock:
+            cache = _load_cache()
+            # Results of previous versions of the same executable are useless.
+            for stale in [stale for stale in cache if stale.rsplit(":", 1)[0] == path]:
+                del cache[stale]
+            cache[key] = info
+            _save_cache(cache)
+    return info
+
+
+def is_supported(info: JdkInfo | None) -> bool:
+    return bool(info) and info.version >= MIN_JAVA_VERSION  # type: ignore[union-attr]
+
+
+def runtime_executables(runtimes: list[dict] | None) -> list[str]:
+    """The java executables of the "java.configuration.runtimes" setting, the default runtime first."""
+    runtimes = sorted(runtimes or [], key=lambda runtime: not runtime.get("default"))
+    return [java_in(runtime["path"]) for runtime in runtimes if runtime.get("path")]
+
+
+def java_in(java_home: str) -> str:
+    return os.path.join(java_home, "bin", "java")
+
+
+def select(java_executable: str, runtimes: list[dict] | None) -> tuple[str, JdkInfo | None]:
+    """
+    Returns `java_executable` if it is a supported JDK or cannot be probed, otherwise the newest supported JDK
+    of `runtimes`. Falls back to `java_executable` with its probe result if none is supported.
+    """
+    info = probe(java_executable)
+    if info is None or is_supported(info):
+        return java_executable, info
+    candidates = [(executable, probe(executable)) for executable in runtime_executables(runtimes)]
+    supported = [(executable, info) for executable, info in candidates if is_supported(info)]
+    if supported:
+        return max(supported, key=lambda candidate: candidate[1].version)  # type: ignore[union-attr]
+    return java_executable, info
+
+
+def unsupported_message(java_executable: str, info: JdkInfo) -> str:
+    return (
+        f"LSP-jdtls: the language server needs Java {MIN_JAVA_VERSION} or newer, but {java_executable} is "
+        f"{info.describe()}. Set JAVA_HOME or java.jdt.ls.java.home to a newer JDK, "
+        "or add one to java.configuration.runtimes."
+    )
+
+
+def _run_probe(path: str) -> JdkInfo | None:
+    startupinfo = None
+    if sublime.platform() == "windows":
+        startupinfo = subprocess.STARTUPINFO()  # type: ignore[attr-defined]
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW  # type: ignore[attr-defined]
+    try:
+        # The properties are printed to stderr.
+        output = subprocess.run(
+            [path, "-XshowSettings:properties", "-version"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            timeout=PROBE_TIMEOUT,
+            startupinfo=startupinfo,
+        ).stdout.decode("utf-8", "replace")
+    except (OSError, subprocess.SubprocessError) as ex:
+        print(f"LSP-jdtls: probing {path} failed: {ex}")
+        return None
+    return parse_properties(output)
+
+
+def parse_properties(output: str) -> JdkInfo | None:
+    properties = {}
+    for line in output.splitlines():
+        match = _PROPERTY.match(line)
+        if match:
+            properties[match.group(1)] = match.group(2).strip()
+    version_string = properties.get("java.version")
+    if not version_string:
+        return None
+    # "1.8.0_402" for Java 8, "21.0.2" or "21" since Java 9.
+    parts = version_string.split(".")
+    try:
+        version = int(parts[1] if parts[0] == "1" and len(parts) > 1 else re.split(r"\D", parts[0])[0])
+    except (ValueError, IndexError):
+        return None
+    vm_name = properties.get("java.vm.name", "")
+    return JdkInfo(
+        version,
+        version_string,
+        properties.get("java.vendor", "unknown vendor"),
+        properties.get("os.arch", "unknown"),
+        # Dynamic archives (-XX:ArchiveClassesAtExit) exist in HotSpot since Java 13, OpenJ9 has its own cache.
+        version >= 13 and "OpenJ9" not in vm_name,
+    )
+
+
+def _cache_path() -> str:
+    return os.path.join(installer.storage_subpath(), CACHE_FILENAME)
+
+
+def _load_cache() -> dict[str, JdkInfo]:
+    global _cache
+    if _cache is None:
+        try:
+            with open(_cache_path(), "r") as file:
+                _cache = {key: JdkInfo(*value) for key, value in json.load(file).items()}
+        except (OSError, ValueError, TypeError):
+            _cache = {}
+    return _cache
+
+
+def _save_cache(cache: dict[str, JdkInfo]) -> None:
+    try:
+        os.makedirs(os.path.dirname(_cache_path()), exist_ok=True)
+        with open(_cache_path() + ".tmp", "w") as file:
+            json.dump({key: list(info) for key, info in cache.items()}, file)
+        os.replace(_cache_path() + ".tmp", _cache_path())
+    except OSError as ex:
+        print(f"LSP-jdtls: cannot save the JDK probes: {ex}")
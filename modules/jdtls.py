@@ -1,8 +1,7 @@
 from __future__ import annotations
 
-import json
 import os
-import re
+from collections import Counter, OrderedDict
 from typing import TYPE_CHECKING, Any, Callable
 from urllib.parse import urlparse
 
@@ -14,21 +13,36 @@ from LSP.plugin import (
     register_plugin,
     unregister_plugin,
 )
-from LSP.plugin.core.views import text_document_identifier
-from LSP.protocol import TextDocumentIdentifier
 from typing_extensions import override
 
-from . import installer
+from . import (
+    class_data_sharing,
+    class_file_cache,
+    gc_monitor,
+    installer,
+    jdk_probe,
+    jvm_sizing,
+    shared_server,
+    startup_timeline,
+    syntax_server,
+    workspace_configuration,
+    workspace_data,
+)
 from .constants import (
-    JDTLS_CONFIG_TO_SUBLIME_SETTING,
+    CLASS_FILE_MEMORY_CACHE_SIZE,
     SESSION_NAME,
     SETTING_JAVA_HOME,
     SETTING_JAVA_HOME_DEPRECATED,
     SETTING_LOMBOK_ENABLED,
     SETTING_PROGRESS_REPORT_ENABLED,
-    VSCODE_PLUGINS,
+    SETTINGS_FILENAME,
+    SHARED_SERVER_DATA_KEY,
+    SYNTAX_SESSION_NAME,
 )
+from .decompiler_strategy import SETTING_PREFERRED, DecompilerStrategy, content_provider
+from .idle_suspension import IdleTracker, server_starting
 from .protocol_extensions_handler import (
+    config_status_extras,
     language_actionableNotification,
     language_progressReport,
     language_status,
@@ -37,13 +51,14 @@ from .utils import (
     add_notification_handler,
     add_request_handler,
     get_settings,
-    view_for_uri_async,
 )
 from .workspace_execute_client_command_handler import workspace_executeClientCommand
 from .workspace_execute_command_handler import handle_client_command
 
 if TYPE_CHECKING:
-    from LSP.plugin import ClientConfig
+    from weakref import ref
+
+    from LSP.plugin import ClientConfig, Notification, Response, Session
     from LSP.protocol import ConfigurationItem, DocumentUri, ExecuteCommandParams
 
 
@@ -54,6 +69,47 @@ if TYPE_CHECKING:
     "language/actionableNotification", language_actionableNotification
 )
 class EclipseJavaDevelopmentTools(AbstractPlugin):
+    _shared_server_commands: dict[int, list[str]] = {}
+    """The commands of the windows using the shared server, which replaces them with a connection to it."""
+    _data_paths: dict[int, str] = {}
+    """The data directories of the servers starting in a window."""
+    _gc_logs: dict[int, tuple[str, int | None]] = {}
+    """The data directory with the GC log and the maximum heap of the servers starting in a window."""
+
+    def __init__(self, weaksession: ref[Session]) -> None:
+        super().__init__(weaksession)
+        self._idle_tracker = IdleTracker(weaksession, self._heap_mb)
+        self._gc_monitor: gc_monitor.GcMonitor | None = None
+        self._data_path: str | None = None
+        self._class_files: OrderedDict[str, str] = OrderedDict()
+        """The most recently opened `jdt:` documents, by their `class_file_cache.cache_key` if they have one."""
+        self._class_file_requests: dict[str, list[Callable[[str, str, str], None]]] = {}
+        """The callbacks waiting for a `java/classFileContents` response by URI."""
+        self.class_file_stats: Counter[str] = Counter()
+        """How `jdt:` documents were served: from "memory", "disk", by joining an "in-flight" request or "server"."""
+        self._decompiler_strategy = DecompilerStrategy()
+        self._workspace_configuration = workspace_configuration.WorkspaceConfiguration(weaksession)
+        self._timeline: startup_timeline.StartupTimeline | None = None
+        session = weaksession()
+        if session:
+            # The plugin is created once the server answered the initialize request.
+            startup_timeline.mark(session.window.id(), "initialize response")
+            self._timeline = startup_timeline.get(session.window.id())
+            self._data_path = self._data_paths.pop(session.window.id(), None)
+            gc_log = self._gc_logs.pop(session.window.id(), None)
+            if gc_log:
+                self._gc_monitor = gc_monitor.GcMonitor(weaksession, *gc_log)
+
+    def _heap_mb(self) -> float | None:
+        """The heap of the server, as last seen in its GC log, else its maximum heap."""
+        session = self.weaksession()
+        # The command is empty for the shared server, whose heap is not freed by ending one session.
+        if not session or not session.config.command:
+            return None
+        if self._gc_monitor and self._gc_monitor.committed_heap_mb:
+            return self._gc_monitor.committed_heap_mb
+        return jvm_sizing.max_heap_mb(session.config.command)
+
     @classmethod
     @override
     def name(cls) -> str:
@@ -65,19 +121,57 @@ class EclipseJavaDevelopmentTools(AbstractPlugin):
     @classmethod
     @override
     def needs_update_or_installation(cls) -> bool:
-        return installer.needs_update_or_installation()
+        with startup_timeline.pending_phase("needs_update_or_installation", first=True):
+            return installer.needs_update_or_installation()
 
     @classmethod
     @override
     def install_or_update(cls) -> None:
-        installer.install_or_update()
+        with startup_timeline.pending_phase("install_or_update"):
+            installer.install_or_update()
 
     # Server configuration
     ######################
 
     @classmethod
     @override
-    def additional_variables(cls) -> dict[str, str] | None:
+    def is_applicable(cls, view: sublime.View, config: ClientConfig) -> bool:
+        return syntax_server.launch_mode(config) != "LightWeight" and super().is_applicable(view, config)
+
+    @classmethod
+    @override
+    def can_start(
+        cls,
+        window: sublime.Window,
+        initiating_view: sublime.View,
+        workspace_folders: list[WorkspaceFolder],
+        configuration: ClientConfig,
+    ) -> str | None:
+        java_executable, info = cls._select_jdk()
+        if info is None:
+            # The server may well start, the probe is no reason to keep it from trying.
+            print(f"LSP-jdtls: cannot determine the Java version of {java_executable}, starting the server anyway")
+            return None
+        if not jdk_probe.is_supported(info):
+            return jdk_probe.unsupported_message(java_executable, info)
+        if java_executable != cls._configured_java_executable():
+            print(f"LSP-jdtls: the configured java is not a supported JDK, using {java_executable}")
+        return None
+
+    @classmethod
+    def _java_executable(cls) -> str:
+        return cls._select_jdk()[0]
+
+    @classmethod
+    def _select_jdk(cls) -> tuple[str, jdk_probe.JdkInfo | None]:
+        """
+        The configured java executable if it is a supported JDK, otherwise the newest supported runtime.
+        """
+        runtimes = get_settings().get("settings").get(jdk_probe.SETTING_RUNTIMES)
+        return jdk_probe.select(cls._configured_java_executable(), runtimes)
+
+    @classmethod
+    def _configured_java_executable(cls) -> str:
         settings = get_settings()
 
         java_home = settings.get("settings").get(SETTING_JAVA_HOME)
@@ -87,16 +181,13 @@ class EclipseJavaDevelopmentTools(AbstractPlugin):
             java_home = os.environ.get("JAVA_HOME")
 
         if java_home:
-            java_executable = os.path.join(java_home, "bin", "java")
+            return os.path.join(java_home, "bin", "java")
         else:
-            java_executable = "java"
-
-        launcher_version = ""
-        for file in os.listdir(os.path.join(installer.jdtls_path(), "plugins")):
-            match = re.search("org.eclipse.equinox.launcher_(.*).jar", file)
-            if match:
-                launcher_version = match.group(1)
+            return "java"
 
+    @classmethod
+    @override
+    def additional_variables(cls) -> dict[str, str] | None:
         def _jdtls_platform() -> str:
             p = sublime.platform()
             if p == "windows":
@@ -109,14 +200,14 @@ class EclipseJavaDevelopmentTools(AbstractPlugin):
                 raise ValueError(f"unknown platform: {p}")
 
         return {
-            "java_executable": java_executable,
+            "java_executable": cls._java_executable(),
             "watch_parent_process": "false"
             if sublime.platform() == "windows"
             else "true",
             "jdtls_platform": _jdtls_platform(),
             "serverdir": installer.jdtls_path(),
             "datadir": installer.jdtls_data_path(),
-            "launcher_version": launcher_version,
+            "launcher_version": installer.launch_manifest()["launcher_version"],
         }
 
     @classmethod
@@ -142,22 +233,107 @@ class EclipseJavaDevelopmentTools(AbstractPlugin):
     @classmethod
     def _insert_bundles(cls, configuration: ClientConfig):
         bundles = configuration.init_options.get("bundles") or []
-        for plugin in VSCODE_PLUGINS:
-            ext_path = installer.vscode_plugin_extension_path(plugin)
-            with open(os.path.join(ext_path, "package.json"), "r") as package_json:
-                jars = (
-                    json.load(package_json)
-                    .get("contributes", {})
-                    .get("javaExtensions", [])
-                )
-                for jar in jars:
-                    abspath = os.path.abspath(
-                        os.path.normpath(os.path.join(ext_path, jar))
-                    )
-                    if abspath not in bundles:
-                        bundles.append(abspath)
+        for abspath in installer.launch_manifest()["bundles"]:
+            if abspath not in bundles:
+                bundles.append(abspath)
         configuration.init_options.set("bundles", bundles)
 
+    @classmethod
+    def _set_data_directory(
+        cls, window: sublime.Window, configuration: ClientConfig, workspace_folders: list[WorkspaceFolder]
+    ):
+        """
+        Edits the command to use the data directory of the workspace folders.
+        """
+        if "-data" not in configuration.command:
+            return
+        folders = [folder.path for folder in workspace_folders]
+        # The shared server serves the folders of all windows from one data directory.
+        key = SHARED_SERVER_DATA_KEY if get_settings().get("sharedServer") else None
+        data_path = workspace_data.acquire(installer.jdtls_data_path(), folders, key)
+        configuration.command[configuration.command.index("-data") + 1] = data_path
+        cls._data_paths[window.id()] = data_path
+
+    @classmethod
+    def _size_jvm(
+        cls, window: sublime.Window, configuration: ClientConfig, workspace_folders: list[WorkspaceFolder]
+    ):
+        """
+        Replaces the heap and GC flags of the command with ones fitting the workspace and the host.
+        """
+        settings = get_settings()
+        # A restart because of heap pressure applies a larger heap even without auto sizing.
+        heap_override = gc_monitor.heap_override(window.id())
+        if not settings.get("jvm.autoSize") and not heap_override:
+            return
+        folders = [folder.path for folder in workspace_folders]
+        if "-data" in configuration.command:
+            data_path = configuration.command[configuration.command.index("-data") + 1]
+            estimate = jvm_sizing.cached_estimate(folders, data_path)
+        else:
+            estimate = jvm_sizing.estimate_workspace(folders)
+        ram_mb = jvm_sizing.physical_memory_mb()
+        # The heap of the configured command is the floor, the estimate does not see the dependencies.
+        min_heap_mb = max(jvm_sizing.max_heap_mb(settings.get("command") or []) or 0, heap_override or 0)
+        sizing = jvm_sizing.compute_sizing(estimate, ram_mb, settings.get("jvm.maxHeapMB"), min_heap_mb)
+        jvm_sizing.apply_sizing(configuration.command, sizing)
+        print(
+            "LSP-jdtls: {}{} java files, {} build files, {} MB RAM: using {}".format(
+                "" if estimate.complete else "more than ",
+                estimate.java_files,
+                estimate.build_descriptors,
+                ram_mb or "unknown",
+                " ".join(sizing.flags()),
+            )
+        )
+
+    @classmethod
+    def _enable_gc_log(cls, window: sublime.Window, configuration: ClientConfig):
+        """
+        Edits the command to write a GC log into the data directory, which is monitored for heap pressure.
+        """
+        if get_settings().get("gcMonitor") == "off" or "-data" not in configuration.command:
+            gc_monitor.disable_log(configuration.command)
+            return
+        data_path = configuration.command[configuration.command.index("-data") + 1]
+        gc_monitor.enable_log(configuration.command, data_path)
+        cls._gc_logs[window.id()] = (data_path, jvm_sizing.max_heap_mb(configuration.command))
+
+    @classmethod
+    def _enable_class_data_sharing(cls, configuration: ClientConfig):
+        """
+        Edits the command to use a class data sharing archive, or to create it in a training run.
+        """
+        info = jdk_probe.probe(cls._java_executable())
+        if not get_settings().get("jvm.classDataSharing") or not (info and info.class_data_sharing):
+            class_data_sharing.remove_archive_flags(configuration.command)
+            return
+        key = class_data_sharing.archive_key(
+            installer.jdtls_path(),
+            configuration.init_options.get("bundles") or [],
+            cls._java_executable(),
+            configuration.command,
+        )
+        if not class_data_sharing.apply_archive_flags(configuration.command, installer.jdtls_path(), key):
+            print("LSP-jdtls: creating a class data sharing archive, the next server start will be faster")
+
+    @classmethod
+    def _use_shared_server(cls, window: sublime.Window, configuration: ClientConfig):
+        """
+        Connects the session to the server shared by all windows instead of starting its own.
+        """
+        if not get_settings().get("sharedServer"):
+            if configuration.init_options.get(shared_server.TOKEN_OPTION):
+                configuration.init_options.remove(shared_server.TOKEN_OPTION)
+            return
+        variables = window.extract_variables()
+        variables.update(cls.additional_variables() or {})
+        command = sublime.expand_variables(configuration.command, variables)
+        configuration.tcp_port, token = shared_server.ensure_shared_server(command, None)
+        configuration.init_options.set(shared_server.TOKEN_OPTION, token)
+        cls._shared_server_commands[window.id()] = configuration.command
+        configuration.command = []
+
     @classmethod
     @override
     def on_pre_start(
@@ -167,9 +343,35 @@ class EclipseJavaDevelopmentTools(AbstractPlugin):
         workspace_folders: list[WorkspaceFolder],
         configuration: ClientConfig,
     ) -> str | None:
+        syntax_server.standard_server_starting(window.id())
+        server_starting(window.id())
+        installer.acquire_components(f"{SESSION_NAME}:{window.id()}")
+        timeline = startup_timeline.begin(window.id(), [folder.path for folder in workspace_folders])
+        with timeline.phase("on_pre_start"):
+            cls._configure(window, workspace_folders, configuration)
+        return None
+
+    @classmethod
+    def _configure(
+        cls,
+        window: sublime.Window,
+        workspace_folders: list[WorkspaceFolder],
+        configuration: ClientConfig,
+    ) -> None:
+        if not configuration.command and window.id() in cls._shared_server_commands:
+            configuration.command = cls._shared_server_commands.pop(window.id())
+            configuration.tcp_port = None
         cls._enable_lombok(configuration)
         cls._insert_bundles(configuration)
+        cls._set_data_directory(window, configuration, workspace_folders)
+        cls._size_jvm(window, configuration, workspace_folders)
+        cls._enable_gc_log(window, configuration)
+        cls._enable_class_data_sharing(configuration)
+        cls._set_init_options(configuration, workspace_folders)
+        cls._use_shared_server(window, configuration)
 
+    @classmethod
+    def _set_init_options(cls, configuration: ClientConfig, workspace_folders: list[WorkspaceFolder]):
         configuration.init_options.set(
             "workspaceFolders", [x.uri() for x in workspace_folders]
         )
@@ -204,7 +406,16 @@ class EclipseJavaDevelopmentTools(AbstractPlugin):
 
         # configuration.init_options.set("triggerFiles", configuration.settings)
 
-        return None
+    @classmethod
+    @override
+    def on_post_start(
+        cls,
+        window: sublime.Window,
+        initiating_view: sublime.View,
+        workspace_folders: list[WorkspaceFolder],
+        configuration: ClientConfig,
+    ) -> None:
+        startup_timeline.mark(window.id(), "server process started")
 
     @override
     def on_open_uri_async(
@@ -215,18 +426,111 @@ class EclipseJavaDevelopmentTools(AbstractPlugin):
         session = self.weaksession()
         if not session:
             return False
-        # https://github.com/redhat-developer/vscode-java/blob/9f32875a67352487f5c414bb7fef04c9b00af89d/src/protocol.ts#L105-L107
-        # https://github.com/redhat-developer/vscode-java/blob/9f32875a67352487f5c414bb7fef04c9b00af89d/src/providerDispatcher.ts#L61-L76
-        # https://github.com/redhat-developer/vscode-java/blob/9f32875a67352487f5c414bb7fef04c9b00af89d/src/providerDispatcher.ts#L27-L28
-        session.send_request_async(
-            Request[TextDocumentIdentifier, str](
-                "java/classFileContents", text_document_identifier(uri), progress=True
-            ),
-            lambda resp: callback(urlparse(uri).path, resp, "Packages/Java/Java.sublime-syntax"),
-            lambda err: callback("ERROR", str(err), "Packages/Text/Plain text.tmLanguage"),
-        )
+        name = urlparse(uri).path
+        provider = content_provider(session.config.settings.get(SETTING_PREFERRED), uri)
+        key = class_file_cache.cache_key(uri, provider)
+        memory_key = key or f"{provider}:{uri}"
+        contents = self._class_files.get(memory_key)
+        if contents is not None:
+            self._class_files.move_to_end(memory_key)
+            self.class_file_stats["memory"] += 1
+            callback(name, contents, "Packages/Java/Java.sublime-syntax")
+            return True
+        waiting = self._class_file_requests.get(uri)
+        if waiting is not None:
+            self.class_file_stats["in-flight"] += 1
+            waiting.append(callback)
+            return True
+        cache = class_file_cache.class_file_cache() if key else None
+        contents = cache.get(key) if cache and key else None
+        if contents is not None:
+            self.class_file_stats["disk"] += 1
+            self._remember_class_file(memory_key, contents)
+            callback(name, contents, "Packages/Java/Java.sublime-syntax")
+            return True
+        self.class_file_stats["server"] += 1
+        self._class_file_requests[uri] = [callback]
+
+        def on_result(contents: str) -> None:
+            self._remember_class_file(memory_key, contents)
+            if cache and key:
+                cache.put(key, contents)
+            for waiting_callback in self._class_file_requests.pop(uri, []):
+                waiting_callback(name, contents, "Packages/Java/Java.sublime-syntax")
+
+        def on_error(error: Any) -> None:
+            for waiting_callback in self._class_file_requests.pop(uri, []):
+                waiting_callback("ERROR", str(error), "Packages/Text/Plain text.tmLanguage")
+
+        self._decompiler_strategy.request(session, uri, on_result, on_error)
         return True
 
+    def _remember_class_file(self, key: str, contents: str) -> None:
+        self._class_files[key] = contents
+        self._class_files.move_to_end(key)
+        while len(self._class_files) > CLASS_FILE_MEMORY_CACHE_SIZE:
+            self._class_files.popitem(last=False)
+
+    # Session events
+    ################
+
+    @override
+    def on_pre_send_request_async(self, request_id: int, request: Request) -> None:
+        self._idle_tracker.touch()
+
+    @override
+    def on_pre_send_notification_async(self, notification: Notification) -> None:
+        self._idle_tracker.touch()
+        if notification.method in ("textDocument/didOpen", "textDocument/didClose"):
+            self._workspace_configuration.views_changed()
+        elif notification.method == "workspace/didChangeConfiguration":
+            self._decompiler_strategy.configuration_sent((notification.params or {}).get("settings"))
+
+    @override
+    def on_session_end_async(self, exit_code: int | None, exception: Exception | None) -> None:
+        session = self.weaksession()
+        if session:
+            installer.release_components(f"{SESSION_NAME}:{session.window.id()}")
+            # The heap of the ended server must not be shown for the next one of the window.
+            config_status_extras.pop(session.window.id(), None)
+        if self.class_file_stats:
+            sources = ", ".join(f"{count} {source}" for source, count in self.class_file_stats.most_common())
+            print(f"LSP-jdtls: served {sum(self.class_file_stats.values())} jdt: documents ({sources})")
+        if session and self._timeline:
+            # A session which ends before the server is ready, e.g. as its window is closed, is still recorded.
+            startup_timeline.finish(session.window.id(), complete=False, timeline=self._timeline)
+        self._workspace_configuration.close()
+        if self._data_path:
+            workspace_data.release(self._data_path)
+
+    @override
+    def on_server_response_async(self, method: str, response: Response) -> None:
+        self._idle_tracker.touch()
+
+    @override
+    def on_server_notification_async(self, notification: Notification) -> None:
+        self._track_progress(notification)
+        session = self.weaksession()
+        if not session:
+            return
+        if notification.method == "textDocument/publishDiagnostics":
+            startup_timeline.mark(session.window.id(), startup_timeline.FIRST_DIAGNOSTICS)
+        elif notification.method == "language/status" and notification.params.get("type") == "ServiceReady":
+            syntax_server.standard_server_ready(session.window.id())
+
+    def _track_progress(self, notification: Notification) -> None:
+        """Every notification of the server counts as activity, reported work keeps the server from idling."""
+        params = notification.params if isinstance(notification.params, dict) else {}
+        if notification.method == "$/progress" and isinstance(params.get("value"), dict):
+            kind = params["value"].get("kind")
+            if kind in ("begin", "end"):
+                self._idle_tracker.progress(str(params.get("token")), kind == "end")
+                return
+        elif notification.method == "language/progressReport":
+            self._idle_tracker.progress(str(params.get("id")), bool(params.get("complete")))
+            return
+        self._idle_tracker.touch()
+
     # Custom command handling
     #########################
 
@@ -246,24 +550,122 @@ class EclipseJavaDevelopmentTools(AbstractPlugin):
 
     @override
     def on_workspace_configuration(self, params: ConfigurationItem, configuration: Any) -> Any:
-        if (
-            "section" in params
-            and "scopeUri" in params
-            and params["section"] in JDTLS_CONFIG_TO_SUBLIME_SETTING
-        ):
-            session = self.weaksession()
-            if session:
-                view = view_for_uri_async(session, params["scopeUri"])
-                if view:
-                    return view.settings().get(
-                        JDTLS_CONFIG_TO_SUBLIME_SETTING[params["section"]], None
-                    )
-        return configuration
+        return self._workspace_configuration.resolve(params, configuration)
+
+
+class EclipseJavaSyntaxServer(AbstractPlugin):
+    """
+    The syntax server of the hybrid and lightweight launch modes, see `syntax_server`.
+    It uses the settings and the installation of the standard server.
+    """
+
+    _data_paths: dict[int, str] = {}
+    """The data directory of the servers starting in a window."""
+
+    @classmethod
+    @override
+    def name(cls) -> str:
+        return SYNTAX_SESSION_NAME
+
+    @classmethod
+    @override
+    def configuration(cls) -> tuple[sublime.Settings, str]:
+        return get_settings(), f"Packages/{str(__package__).split('.')[0]}/{SETTINGS_FILENAME}"
+
+    @classmethod
+    @override
+    def needs_update_or_installation(cls) -> bool:
+        return installer.needs_update_or_installation()
+
+    @classmethod
+    @override
+    def install_or_update(cls) -> None:
+        installer.install_or_update()
+
+    @classmethod
+    @override
+    def additional_variables(cls) -> dict[str, str] | None:
+        return EclipseJavaDevelopmentTools.additional_variables()
+
+    @classmethod
+    @override
+    def can_start(
+        cls,
+        window: sublime.Window,
+        initiating_view: sublime.View,
+        workspace_folders: list[WorkspaceFolder],
+        configuration: ClientConfig,
+    ) -> str | None:
+        return EclipseJavaDevelopmentTools.can_start(window, initiating_view, workspace_folders, configuration)
+
+    @classmethod
+    @override
+    def is_applicable(cls, view: sublime.View, config: ClientConfig) -> bool:
+        window = view.window()
+        return bool(window) and syntax_server.is_needed(window.id(), config) and super().is_applicable(view, config)
+
+    @classmethod
+    @override
+    def on_pre_start(
+        cls,
+        window: sublime.Window,
+        initiating_view: sublime.View,
+        workspace_folders: list[WorkspaceFolder],
+        configuration: ClientConfig,
+    ) -> str | None:
+        installer.acquire_components(f"{SYNTAX_SESSION_NAME}:{window.id()}")
+        EclipseJavaDevelopmentTools._enable_lombok(configuration)
+        data_path = None
+        if "-data" in configuration.command:
+            folders = [folder.path for folder in workspace_folders]
+            key = workspace_data.syntax_server_key(workspace_data.workspace_key(folders))
+            data_path = workspace_data.acquire(installer.jdtls_data_path(), folders, key)
+            cls._data_paths[window.id()] = data_path
+        syntax_server.configure_command(configuration.command, data_path)
+        EclipseJavaDevelopmentTools._set_init_options(configuration, workspace_folders)
+        return None
+
+    @classmethod
+    @override
+    def on_post_start(
+        cls,
+        window: sublime.Window,
+        initiating_view: sublime.View,
+        workspace_folders: list[WorkspaceFolder],
+        configuration: ClientConfig,
+    ) -> None:
+        startup_timeline.mark(window.id(), "syntax server process started")
+
+    def __init__(self, weaksession: ref[Session]) -> None:
+        super().__init__(weaksession)
+        self._data_path: str | None = None
+        session = weaksession()
+        if session:
+            self._data_path = self._data_paths.pop(session.window.id(), None)
+            syntax_server.register_session(session)
+            startup_timeline.mark(session.window.id(), "syntax server initialize response")
+
+    @override
+    def on_session_end_async(self, exit_code: int | None, exception: Exception | None) -> None:
+        session = self.weaksession()
+        if session:
+            installer.release_components(f"{SYNTAX_SESSION_NAME}:{session.window.id()}")
+        if self._data_path:
+            workspace_data.release(self._data_path)
 
 
 def plugin_loaded() -> None:
     register_plugin(EclipseJavaDevelopmentTools)
+    register_plugin(EclipseJavaSyntaxServer)
+    # Download a changed "version" setting in the background, it is activated by the next server start.
+    get_settings().add_on_change("LSP-jdtls-prefetch", installer.prefetch_async)
+    workspace_configuration.watch_preferences()
+    installer.prefetch_async()
 
 
 def plugin_unloaded() -> None:
+    get_settings().clear_on_change("LSP-jdtls-prefetch")
+    workspace_configuration.unwatch_preferences()
+    shared_server.stop_shared_server()
+    unregister_plugin(EclipseJavaSyntaxServer)
     unregister_plugin(EclipseJavaDevelopmentTools)
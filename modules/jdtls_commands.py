@@ -1,16 +1,16 @@
 from __future__ import annotations
 
 import os
-import shutil
 from typing import TYPE_CHECKING
 
 import sublime
 import sublime_plugin
 from LSP.plugin import Request, Session
 
-from . import installer
-from .constants import SESSION_NAME
-from .utils import LspJdtlsTextCommand
+from . import installer, startup_timeline, workspace_data
+from .constants import SESSION_NAME, SHARED_SERVER_DATA_KEY
+from .quick_input_panel import QuickTextInput
+from .utils import LspJdtlsTextCommand, get_settings
 
 if TYPE_CHECKING:
     from LSP.plugin.core.protocol import ResponseError
@@ -43,12 +43,80 @@ class LspJdtlsBuildWorkspace(LspJdtlsTextCommand):
 
 
 class JdtlsClearData(sublime_plugin.TextCommand):
+    """
+    Clears the server data of the workspace of the current window. Other workspaces keep theirs.
+    """
+
     def run(self, edit: sublime.Edit) -> None:
+        window = self.view.window()
+        if window is None:
+            return
         if sublime.ok_cancel_dialog(
-            "Are you sure you want to clear " + installer.jdtls_data_path()
+            "Are you sure you want to clear the server data of the folders\n\n"
+            + "\n".join(window.folders())
         ):
-            if os.path.exists(installer.jdtls_data_path()):
-                shutil.rmtree(installer.jdtls_data_path())
+            # The shared server keeps the data of all windows in one directory.
+            key = SHARED_SERVER_DATA_KEY if get_settings().get("sharedServer") else None
+            if workspace_data.clear(installer.jdtls_data_path(), window.folders(), key):
                 self.view.run_command(
                     "lsp_restart_server", {"config_name": SESSION_NAME}
                 )
+
+
+class JdtlsRollback(sublime_plugin.TextCommand):
+    def run(self, edit: sublime.Edit) -> None:
+        if not sublime.ok_cancel_dialog(
+            "Switch back to the previously installed jdtls version and restart the server?"
+        ):
+            return
+        try:
+            versions = installer.rollback()
+        except Exception as e:
+            sublime.error_message(f"LSP-jdtls: rollback failed: {e}")
+            return
+        if not versions:
+            sublime.message_dialog("LSP-jdtls: no previous version is installed.")
+            return
+        sublime.status_message("LSP-jdtls: rolled back to jdtls " + versions["jdtls"])
+        self.view.run_command("lsp_restart_server", {"config_name": SESSION_NAME})
+
+
+class JdtlsExportArtifactMirror(sublime_plugin.WindowCommand):
+    """
+    Exports the server artifacts into a directory which other machines can install from
+    without internet access, using the `artifactSource` setting.
+    """
+
+    def run(self) -> None:
+        QuickTextInput(
+            self.window,
+            "Directory to export the artifact mirror to",
+            os.path.join(os.path.expanduser("~"), "LSP-jdtls-mirror"),
+        ).show().then(lambda directory: sublime.set_timeout_async(lambda: self._export_async(directory)))
+
+    def _export_async(self, directory: str | None) -> None:
+        if not directory:
+            return
+        self.window.status_message("LSP-jdtls: exporting artifact mirror...")
+        try:
+            installer.export_mirror(directory)
+        except Exception as e:
+            sublime.error_message(f"LSP-jdtls: exporting the artifact mirror failed: {e}")
+            return
+        self.window.status_message("LSP-jdtls: exported artifact mirror to " + directory)
+
+
+class JdtlsShowStartupTimeline(sublime_plugin.WindowCommand):
+    """
+    Shows how long the phases of the last server start of the window took, and the durations of earlier starts.
+    """
+
+    def run(self) -> None:
+        report = startup_timeline.format_report(
+            startup_timeline.last(self.window.id()), startup_timeline.history()
+        )
+        view = self.window.new_file()
+        view.set_name("LSP-jdtls: Startup Timeline")
+        view.set_scratch(True)
+        view.run_command("append", {"characters": report})
+        view.set_read_only(True)
@@ -0,0 +1,188 @@
+"""
+Sizes the heap and chooses the garbage collector of the jdtls JVM.
+
+The estimate is based on the number of Java sources and build descriptors in the workspace folders,
+capped by the physical memory of the host and the "jvm.maxHeapMB" setting. It is stored in the data
+directory of the workspace and refreshed in the background once a day, so a start does not wait for the scan.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import json
+import os
+import re
+import threading
+import time
+from typing import NamedTuple
+
+import sublime
+
+BUILD_DESCRIPTORS = {"pom.xml", "build.gradle", "build.gradle.kts", ".project", "build.xml"}
+SKIPPED_DIRS = {".git", ".hg", ".svn", "node_modules", "target", "build", "bin", "out", ".gradle", ".idea"}
+SCAN_TIME_LIMIT = 1.0
+"""Seconds after which the workspace scan stops and the files seen so far are extrapolated."""
+MIN_HEAP_MB = 512
+BASE_HEAP_MB = 384
+HEAP_MB_PER_JAVA_FILE = 0.1
+HEAP_MB_PER_BUILD_DESCRIPTOR = 8
+MAX_HEAP_RAM_FRACTION = 0.25
+"""The heap never exceeds this share of the physical memory, the editor and the build tools need the rest."""
+G1_MIN_HEAP_MB = 4096
+"""From this heap size on the G1 collector is used, its shorter pauses matter more than the throughput of ParallelGC."""
+ESTIMATE_FILENAME = "workspace_estimate.json"
+ESTIMATE_MAX_AGE = 24 * 60 * 60
+_UNITS_MB = {"K": 1 / 1024, "M": 1, "G": 1024}
+
+_HEAP_FLAG = re.compile(r"^-Xm[xs]\d+[kKmMgG]?$")
+_GC_FLAG = re.compile(r"^-XX:(\+Use\w+GC|GCTimeRatio=\d+|AdaptiveSizePolicyWeight=\d+|MaxGCPauseMillis=\d+)$")
+
+
+class WorkspaceEstimate(NamedTuple):
+    java_files: int
+    build_descriptors: int
+    complete: bool
+    """False if the scan hit the time limit."""
+
+
+class JvmSizing(NamedTuple):
+    max_heap_mb: int
+    initial_heap_mb: int
+    gc_flags: list[str]
+
+    def flags(self) -> list[str]:
+        return self.gc_flags + [f"-Xmx{self.max_heap_mb}m", f"-Xms{self.initial_heap_mb}m"]
+
+
+def physical_memory_mb() -> int | None:
+    """The physical memory of the host, or None if it cannot be determined."""
+    if sublime.platform() == "windows":
+
+        class MemoryStatusEx(ctypes.Structure):
+            _fields_ = [
+                ("dwLength", ctypes.c_ulong),
+                ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong),
+                ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong),
+                ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong),
+                ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("sullAvailExtendedVirtual", ctypes.c_ulonglong),
+            ]
+
+        status = MemoryStatusEx()
+        status.dwLength = ctypes.sizeof(MemoryStatusEx)
+        if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):  # type: ignore[attr-defined]
+            return None
+        return status.ullTotalPhys // (1024 * 1024)
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def estimate_workspace(folders: list[str]) -> WorkspaceEstimate:
+    """Counts the Java sources and build descriptors in `folders`, skipping VCS and build output directories."""
+    java_files = 0
+    build_descriptors = 0
+    deadline = time.monotonic() + SCAN_TIME_LIMIT
+    pending = list(folders)
+    while pending:
+        if time.monotonic() > deadline:
+            return WorkspaceEstimate(java_files, build_descriptors, False)
+        try:
+            entries = os.scandir(pending.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIPPED_DIRS:
+                            pending.append(entry.path)
+                    elif entry.name.endswith(".java"):
+                        java_files += 1
+                    elif entry.name in BUILD_DESCRIPTORS:
+                        build_descriptors += 1
+                except OSError:
+                    pass
+    return WorkspaceEstimate(java_files, build_descriptors, True)
+
+
+def cached_estimate(folders: list[str], data_path: str) -> WorkspaceEstimate:
+    """
+    The estimate stored in the data directory `data_path`. Only the first start of a workspace scans it,
+    an estimate older than `ESTIMATE_MAX_AGE` is used once more while it is refreshed in the background.
+    """
+    path = os.path.join(data_path, ESTIMATE_FILENAME)
+    try:
+        with open(path, "r") as file:
+            stored = json.load(file)
+        if stored["folders"] == folders:
+            if time.time() - stored["time"] > ESTIMATE_MAX_AGE:
+                threading.Thread(target=_store_estimate, args=(folders, path), daemon=True).start()
+            return WorkspaceEstimate(*stored["estimate"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return _store_estimate(folders, path)
+
+
+def _store_estimate(folders: list[str], path: str) -> WorkspaceEstimate:
+    estimate = estimate_workspace(folders)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as file:
+            json.dump({"folders": folders, "time": time.time(), "estimate": list(estimate)}, file)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"LSP-jdtls: cannot store the workspace estimate: {e}")
+    return estimate
+
+
+def max_heap_mb(command: list[str]) -> int | None:
+    """The -Xmx of `command` in MB."""
+    for arg in reversed(command):
+        match = re.match(r"^-Xmx(\d+)([kKmMgG]?)$", arg)
+        if match:
+            return int(int(match.group(1)) * _UNITS_MB.get(match.group(2).upper(), 1 / 1024 / 1024))
+    return None
+
+
+def compute_sizing(
+    estimate: WorkspaceEstimate, ram_mb: int | None, max_heap_cap_mb: int | None, min_heap_mb: int | None = None
+) -> JvmSizing:
+    """
+    `min_heap_mb`, e.g. the -Xmx of the configured command, overrides the estimate and the memory based limit,
+    but not `max_heap_cap_mb`.
+    """
+    heap = BASE_HEAP_MB + estimate.java_files * HEAP_MB_PER_JAVA_FILE
+    heap += estimate.build_descriptors * HEAP_MB_PER_BUILD_DESCRIPTOR
+    if not estimate.complete:
+        # The scan did not finish, so the workspace is at least large.
+        heap *= 2
+    if ram_mb:
+        heap = min(heap, ram_mb * MAX_HEAP_RAM_FRACTION)
+    if min_heap_mb:
+        heap = max(heap, min_heap_mb)
+    if max_heap_cap_mb:
+        heap = min(heap, max_heap_cap_mb)
+    # Round up to 256 MB steps, so small changes of the workspace do not change the flags on every start.
+    max_heap = max(MIN_HEAP_MB, int(-(-heap // 256) * 256))
+    if max_heap_cap_mb:
+        max_heap = min(max_heap, max(max_heap_cap_mb, 64))
+    # Large workspaces grow the heap anyway while importing, starting bigger saves the resizing collections.
+    initial_heap = max(100, max_heap // 4) if max_heap >= G1_MIN_HEAP_MB else 100
+    if max_heap >= G1_MIN_HEAP_MB:
+        gc_flags = ["-XX:+UseG1GC", "-XX:MaxGCPauseMillis=200"]
+    else:
+        # The defaults of the command, as used by vscode-java.
+        gc_flags = ["-XX:+UseParallelGC", "-XX:GCTimeRatio=4", "-XX:AdaptiveSizePolicyWeight=90"]
+    return JvmSizing(max_heap, min(initial_heap, max_heap), gc_flags)
+
+
+def apply_sizing(command: list[str], sizing: JvmSizing) -> None:
+    """Replaces the heap and GC flags of `command` with the ones of `sizing`."""
+    command[:] = [arg for arg in command if not _HEAP_FLAG.match(arg) and not _GC_FLAG.match(arg)]
+    jar_index = command.index("-jar")
+    command[jar_index:jar_index] = sizing.flags()
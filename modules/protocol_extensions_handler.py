@@ -10,6 +10,7 @@ from typing import TYPE_CHECKING
 
 import sublime
 
+from . import startup_timeline
 from .quick_input_panel import QuickSelect, SelectableItem
 
 if TYPE_CHECKING:
@@ -57,22 +58,29 @@ def language_actionableNotification(
 
 
 progress_reports: dict[str, str] = {}
+config_status_extras: dict[int, str] = {}
+"""Further parts of the config status by window, e.g. the heap usage."""
 
 
 def language_progressReport(session: Session, params: ProgressReport) -> None:
+    startup_timeline.mark(session.window.id(), "language/progressReport first report")
+    if params["complete"]:
+        startup_timeline.mark(session.window.id(), "language/progressReport {} complete".format(params["task"]))
     key = params.get("id", "jdtls-status-dummy-key")
     progress_reports[key] = "{}% {}".format(params["workDone"] / params["totalWork"] * 100, params["task"])
-    _update_config_status_async(session)
+    update_config_status_async(session)
     if params["complete"]:
         progress_reports.pop(key, None)
-        sublime.set_timeout_async(lambda: _update_config_status_async(session), 1000)
+        sublime.set_timeout_async(lambda: update_config_status_async(session), 1000)
 
 
-def _update_config_status_async(session: Session) -> None:
-    session.set_config_status_async(", ".join(progress_reports.values()))
+def update_config_status_async(session: Session) -> None:
+    extra = config_status_extras.get(session.window.id())
+    session.set_config_status_async(", ".join(list(progress_reports.values()) + ([extra] if extra else [])))
 
 
 def language_status(session: Session, params: StatusReport) -> None:
+    startup_timeline.mark(session.window.id(), "language/status " + params.get("type", ""))
     message = params.get("message")
     if not message:
         return
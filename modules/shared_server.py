@@ -0,0 +1,617 @@
+"""
+A local proxy which lets the sessions of all windows share one jdtls process.
+
+The sessions connect to the proxy over TCP on the loopback interface and have to send the secret token of
+the proxy in the initialization options of their initialize request, other connections are closed.
+The first session initializes the server, later ones get its initialize result and add their workspace
+folders with `workspace/didChangeWorkspaceFolders`. Messages are routed between the sessions and the server:
+
+- Request ids of the sessions are rewritten, so they do not clash in the server.
+- Documents opened in several windows are opened once in the server, with the text of the window which
+  changed them last. The proxy keeps the text of every session, when another window changes a document
+  or the window owning it closes it, the server gets the text of the new owner by closing and reopening it.
+- Diagnostics go to the sessions which have the document open or contain it in a workspace folder,
+  including `jdt:` documents of dependencies.
+- Server requests like `workspace/executeClientCommand` go to the session which was active last,
+  `workspace/configuration` to the one owning the scope uri, and capability registrations to all of them.
+- Other notifications, e.g. `language/status` and `language/progressReport`, are sent to all sessions.
+
+The server is shut down when the last session disconnects.
+"""
+
+from __future__ import annotations
+
+import hmac
+import itertools
+import json
+import secrets
+import socket
+import subprocess
+import threading
+from typing import IO, Any, Dict
+
+import sublime
+
+JsonRpcMessage = Dict[str, Any]
+
+TOKEN_OPTION = "sharedServerToken"
+"""The initialization option with the token of the proxy."""
+
+_BROADCAST_REQUESTS = {"client/registerCapability", "client/unregisterCapability", "window/workDoneProgress/create"}
+_ACTIVE_CLIENT_NOTIFICATIONS = {"window/showMessage"}
+
+
+class _Connection:
+    """Reads and writes messages with the LSP base protocol framing."""
+
+    def __init__(self, reader: IO[bytes], writer: IO[bytes]) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._write_lock = threading.Lock()
+
+    def read(self) -> JsonRpcMessage | None:
+        """Returns the next message, or None once the stream is closed."""
+        length = None
+        while True:
+            line = self._reader.readline()
+            if not line:
+                return None
+            line = line.strip()
+            if not line:
+                break
+            name, _, value = line.decode("ascii").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        if length is None:
+            return None
+        body = self._reader.read(length)
+        if len(body) < length:
+            return None
+        return json.loads(body.decode("utf-8"))
+
+    def write(self, message: JsonRpcMessage) -> None:
+        body = json.dumps(message, ensure_ascii=False).encode("utf-8")
+        with self._write_lock:
+            try:
+                self._writer.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+                self._writer.flush()
+            except (OSError, ValueError):
+                # The other side disconnected, its reader thread cleans up.
+                pass
+
+
+class _Document:
+    """The text of a document as a session sees it."""
+
+    def __init__(self, language_id: str, version: int, text: str) -> None:
+        self.language_id = language_id
+        self.version = version
+        self.text = text
+
+    def apply(self, params: JsonRpcMessage) -> None:
+        """Applies the changes of a `textDocument/didChange` notification."""
+        self.version = params["textDocument"].get("version", self.version)
+        for change in params["contentChanges"]:
+            if "range" not in change:
+                self.text = change["text"]
+                continue
+            start = _offset(self.text, change["range"]["start"])
+            end = _offset(self.text, change["range"]["end"])
+            self.text = self.text[:start] + change["text"] + self.text[end:]
+
+    def open_notification(self, uri: str) -> JsonRpcMessage:
+        return {
+            "jsonrpc": "2.0",
+            "method": "textDocument/didOpen",
+            "params": {
+                "textDocument": {
+                    "uri": uri,
+                    "languageId": self.language_id,
+                    "version": self.version,
+                    "text": self.text,
+                },
+            },
+        }
+
+
+def _offset(text: str, position: JsonRpcMessage) -> int:
+    """The offset in `text` of an LSP position, whose character counts UTF-16 code units."""
+    line_start = 0
+    for _ in range(position["line"]):
+        line_end = text.find("\n", line_start)
+        if line_end < 0:
+            return len(text)
+        line_start = line_end + 1
+    line_end = text.find("\n", line_start)
+    line = text[line_start:line_end if line_end >= 0 else len(text)]
+    units = line.encode("utf-16-le")[: position["character"] * 2]
+    return line_start + len(units.decode("utf-16-le", "ignore"))
+
+
+def _close_notification(uri: str) -> JsonRpcMessage:
+    return {"jsonrpc": "2.0", "method": "textDocument/didClose", "params": {"textDocument": {"uri": uri}}}
+
+
+class _Client:
+    def __init__(self, client_id: int, connection: _Connection, sock: socket.socket) -> None:
+        self.id = client_id
+        self.connection = connection
+        self.socket = sock
+        self.folders: list[JsonRpcMessage] = []
+        """The workspace folders of the session, as sent in its initialize request."""
+        self.initialized = False
+        self.documents: dict[str, _Document] = {}
+        """The open documents of the session by uri."""
+
+    def close(self) -> None:
+        # The files of the connection keep the socket open, shutting it down ends the connection anyway.
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+
+class _ServerRequest:
+    """A request of the server which was forwarded to one or more sessions and is answered by the first response."""
+
+    def __init__(self, server_id: int | str | None, clients: set[int]) -> None:
+        self.server_id = server_id
+        """None for requests of the proxy itself, whose responses are dropped."""
+        self.pending = clients
+
+
+class SharedServer:
+    def __init__(self, command: list[str], cwd: str | None) -> None:
+        self.command = command
+        self._cwd = cwd
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._clients: dict[int, _Client] = {}
+        self._active_client: int | None = None
+        self._requests: dict[int, tuple[int, int | str]] = {}
+        """Proxy request id to the session and its own request id."""
+        self._server_requests: dict[str, _ServerRequest] = {}
+        self._documents_lock = threading.Lock()
+        """Guards the open documents and orders the document notifications to the server."""
+        self._open_documents: dict[str, list[int]] = {}
+        """Document uri to the sessions which have it open. The first one owns it, the server has its text."""
+        self._registrations: dict[str, JsonRpcMessage] = {}
+        self._server_folders: list[JsonRpcMessage] = []
+        """The workspace folders the server knows."""
+        self._initialize_result: JsonRpcMessage | None = None
+        self._waiting_for_initialize: list[tuple[_Client, int | str]] = []
+        self._initialize_request: int | None = None
+        self._process: subprocess.Popen | None = None
+        self._server: _Connection | None = None
+        self._listener: socket.socket | None = None
+        self.port = 0
+        self.token = secrets.token_hex(32)
+        """The secret a session has to present, see `TOKEN_OPTION`."""
+
+    def start(self) -> None:
+        startupinfo = None
+        if sublime.platform() == "windows":
+            startupinfo = subprocess.STARTUPINFO()  # type: ignore[attr-defined]
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW  # type: ignore[attr-defined]
+        self._process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self._cwd,
+            startupinfo=startupinfo,
+        )
+        assert self._process.stdin and self._process.stdout
+        self._server = _Connection(self._process.stdout, self._process.stdin)
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.bind(("127.0.0.1", 0))
+        self._listener.listen()
+        self.port = self._listener.getsockname()[1]
+        loops = ((self._accept_loop, "accept"), (self._server_loop, "server"), (self._stderr_loop, "stderr"))
+        for target, name in loops:
+            threading.Thread(target=target, name=f"LSP-jdtls shared server {name}", daemon=True).start()
+
+    def is_running(self) -> bool:
+        return bool(self._process and self._process.poll() is None and self._listener)
+
+    def stop(self) -> None:
+        """Asks the server to exit. Does not wait for it, it is killed in the background if it does not exit."""
+        with self._lock:
+            listener, self._listener = self._listener, None
+            clients = list(self._clients.values())
+            self._clients.clear()
+        if listener:
+            listener.close()
+        for client in clients:
+            client.close()
+        if self._process and self._process.poll() is None:
+            assert self._server
+            self._server.write({"jsonrpc": "2.0", "id": "proxy-shutdown", "method": "shutdown"})
+            self._server.write({"jsonrpc": "2.0", "method": "exit"})
+            threading.Thread(target=self._kill_after_timeout, name="LSP-jdtls shared server exit", daemon=True).start()
+
+    def _kill_after_timeout(self) -> None:
+        assert self._process
+        try:
+            self._process.wait(10)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+
+    # Threads
+    #########
+
+    def _accept_loop(self) -> None:
+        while True:
+            listener = self._listener
+            if not listener:
+                return
+            try:
+                sock, _ = listener.accept()
+            except OSError:
+                return
+            client = _Client(next(self._ids), _Connection(sock.makefile("rb"), sock.makefile("wb")), sock)
+            threading.Thread(
+                target=self._client_loop, args=(client,), name=f"LSP-jdtls shared client {client.id}", daemon=True
+            ).start()
+
+    def _authenticate(self, message: JsonRpcMessage | None) -> bool:
+        """Whether `message` is an initialize request with the token, which is removed from it."""
+        if not message or message.get("method") != "initialize":
+            return False
+        options = (message.get("params") or {}).get("initializationOptions")
+        token = options.pop(TOKEN_OPTION, None) if isinstance(options, dict) else None
+        return isinstance(token, str) and hmac.compare_digest(token, self.token)
+
+    def _client_loop(self, client: _Client) -> None:
+        try:
+            message = client.connection.read()
+            if not self._authenticate(message):
+                print("LSP-jdtls: the shared server refused a connection without its token")
+                client.close()
+                return
+            with self._lock:
+                if not self._listener:
+                    client.close()
+                    return
+                self._clients[client.id] = client
+            self._on_client_message(client, message)  # type: ignore[arg-type]
+            while True:
+                message = client.connection.read()
+                if message is None or message.get("method") == "exit":
+                    break
+                self._on_client_message(client, message)
+        except (OSError, ValueError) as e:
+            print(f"LSP-jdtls: shared server connection failed: {e}")
+        self._remove_client(client)
+
+    def _server_loop(self) -> None:
+        assert self._server
+        while True:
+            try:
+                message = self._server.read()
+            except (OSError, ValueError) as e:
+                print(f"LSP-jdtls: shared server failed: {e}")
+                message = None
+            if message is None:
+                break
+            self._on_server_message(message)
+        print("LSP-jdtls: shared server exited")
+        self.stop()
+
+    def _stderr_loop(self) -> None:
+        assert self._process and self._process.stderr
+        for line in self._process.stderr:
+            print("LSP-jdtls: shared server:", line.decode("utf-8", "replace").rstrip())
+
+    # Session to server
+    ###################
+
+    def _on_client_message(self, client: _Client, message: JsonRpcMessage) -> None:
+        assert self._server
+        method = message.get("method")
+        if method is None:
+            self._on_client_response(message)
+            return
+        with self._lock:
+            self._active_client = client.id
+        if "id" in message:
+            self._on_client_request(client, message)
+        elif method == "initialized":
+            self._on_client_initialized(client, message)
+        elif method in ("textDocument/didOpen", "textDocument/didClose", "textDocument/didChange"):
+            self._on_document_notification(client, message)
+        elif method.startswith("textDocument/"):
+            uri = message.get("params", {}).get("textDocument", {}).get("uri")
+            with self._documents_lock:
+                owners = self._open_documents.get(uri)
+                if not owners or owners[0] == client.id:
+                    self._server.write(message)
+        elif method == "$/cancelRequest":
+            with self._lock:
+                proxy_id = next(
+                    (proxy_id for proxy_id, (owner, request_id) in self._requests.items()
+                     if owner == client.id and request_id == message["params"]["id"]),
+                    None,
+                )
+            if proxy_id is not None:
+                self._server.write({**message, "params": {"id": proxy_id}})
+        elif method == "workspace/didChangeWorkspaceFolders":
+            event = message["params"]["event"]
+            with self._lock:
+                client.folders = [f for f in client.folders if f not in event["removed"]] + event["added"]
+                other_folders = [f for other in self._clients.values() if other is not client for f in other.folders]
+                added = [f for f in event["added"] if f not in self._server_folders]
+                removed = [f for f in event["removed"] if f in self._server_folders and f not in other_folders]
+                self._server_folders = [f for f in self._server_folders if f not in removed] + added
+            self._change_folders(added, removed)
+        else:
+            self._server.write(message)
+
+    def _on_client_request(self, client: _Client, message: JsonRpcMessage) -> None:
+        assert self._server
+        method = message["method"]
+        if method == "shutdown":
+            # The server keeps running for the other sessions, the session is removed on exit.
+            client.connection.write({"jsonrpc": "2.0", "id": message["id"], "result": None})
+            return
+        proxy_id = next(self._ids)
+        with self._lock:
+            self._requests[proxy_id] = (client.id, message["id"])
+            if method == "initialize":
+                client.folders = message.get("params", {}).get("workspaceFolders") or []
+                if self._initialize_request is not None:
+                    # Only the first session initializes the server.
+                    del self._requests[proxy_id]
+                    if self._initialize_result is None:
+                        self._waiting_for_initialize.append((client, message["id"]))
+                    else:
+                        response = {"jsonrpc": "2.0", "id": message["id"], "result": self._initialize_result}
+                        client.connection.write(response)
+                    return
+                self._initialize_request = proxy_id
+                self._server_folders = list(client.folders)
+        self._server.write({**message, "id": proxy_id})
+
+    def _on_client_initialized(self, client: _Client, message: JsonRpcMessage) -> None:
+        assert self._server
+        with self._lock:
+            client.initialized = True
+            first = not any(other.initialized for other in self._clients.values() if other is not client)
+            registrations = list(self._registrations.values())
+            added = [f for f in client.folders if f not in self._server_folders]
+            self._server_folders += added
+        if first:
+            self._server.write(message)
+        # The session which initialized the server is not necessarily the first to finish its initialization.
+        self._change_folders(added, [])
+        if registrations:
+            self._request_clients([client], "client/registerCapability", {"registrations": registrations}, None)
+
+    def _change_folders(self, added: list[JsonRpcMessage], removed: list[JsonRpcMessage]) -> None:
+        assert self._server
+        if added or removed:
+            self._server.write({
+                "jsonrpc": "2.0",
+                "method": "workspace/didChangeWorkspaceFolders",
+                "params": {"event": {"added": added, "removed": removed}},
+            })
+
+    def _on_document_notification(self, client: _Client, message: JsonRpcMessage) -> None:
+        """Tracks the text of the document in the session and keeps the server at the text of its owner."""
+        assert self._server
+        method = message["method"]
+        params = message["params"]
+        uri = params["textDocument"]["uri"]
+        with self._documents_lock:
+            owners = self._open_documents.setdefault(uri, [])
+            if method == "textDocument/didOpen":
+                document = params["textDocument"]
+                client.documents[uri] = _Document(document["languageId"], document["version"], document["text"])
+                if client.id not in owners:
+                    owners.append(client.id)
+                if owners[0] == client.id:
+                    self._server.write(message)
+            elif method == "textDocument/didChange":
+                document = client.documents.get(uri)
+                if document:
+                    document.apply(params)
+                if owners and owners[0] == client.id:
+                    self._server.write(message)
+                elif document:
+                    # The window changing the document becomes its owner.
+                    if client.id in owners:
+                        owners.remove(client.id)
+                    owners.insert(0, client.id)
+                    self._server.write(_close_notification(uri))
+                    self._server.write(document.open_notification(uri))
+            else:
+                client.documents.pop(uri, None)
+                self._release_document(client, uri)
+
+    def _release_document(self, client: _Client, uri: str) -> None:
+        """Removes `client` from the owners of the document, call with the documents lock held."""
+        assert self._server
+        owners = self._open_documents.get(uri)
+        if owners is None or client.id not in owners:
+            return
+        was_owner = owners[0] == client.id
+        owners.remove(client.id)
+        if not owners:
+            del self._open_documents[uri]
+            self._server.write(_close_notification(uri))
+            return
+        document = self._clients[owners[0]].documents.get(uri) if owners[0] in self._clients else None
+        if was_owner and document:
+            self._server.write(_close_notification(uri))
+            self._server.write(document.open_notification(uri))
+
+    def _on_client_response(self, message: JsonRpcMessage) -> None:
+        assert self._server
+        with self._lock:
+            request = self._server_requests.pop(str(message.get("id")), None)
+            if not request or request.server_id is None:
+                return
+            server_id = request.server_id
+            # Only the first response of a broadcast request is forwarded.
+            request.server_id = None
+        self._server.write({**message, "id": server_id})
+
+    def _remove_client(self, client: _Client) -> None:
+        assert self._server
+        with self._lock:
+            if self._clients.pop(client.id, None) is None:
+                return
+            remaining = list(self._clients.values())
+            other_folders = [f for other in remaining for f in other.folders]
+            removed = [f for f in self._server_folders if f in client.folders and f not in other_folders]
+            self._server_folders = [f for f in self._server_folders if f not in removed]
+            for proxy_id, (owner, _) in list(self._requests.items()):
+                if owner == client.id:
+                    del self._requests[proxy_id]
+            unanswered = []
+            for request_id, request in list(self._server_requests.items()):
+                request.pending.discard(client.id)
+                if not request.pending:
+                    del self._server_requests[request_id]
+                    if request.server_id is not None:
+                        unanswered.append(request.server_id)
+            if self._active_client == client.id:
+                self._active_client = remaining[0].id if remaining else None
+        client.close()
+        if not remaining:
+            self.stop()
+            return
+        for server_id in unanswered:
+            self._server.write({"jsonrpc": "2.0", "id": server_id, "result": None})
+        with self._documents_lock:
+            for uri in list(client.documents):
+                self._release_document(client, uri)
+            client.documents.clear()
+        self._change_folders([], removed)
+
+    # Server to session
+    ###################
+
+    def _on_server_message(self, message: JsonRpcMessage) -> None:
+        method = message.get("method")
+        if method is None:
+            self._on_server_response(message)
+        elif "id" in message:
+            self._on_server_request(message)
+        else:
+            self._send_to_clients(self._notification_clients(message), message)
+
+    def _on_server_response(self, message: JsonRpcMessage) -> None:
+        with self._lock:
+            target = self._requests.pop(message.get("id"), None)  # type: ignore[arg-type]
+            if not target:
+                return
+            client = self._clients.get(target[0])
+            waiting: list[tuple[_Client, int | str]] = []
+            if message.get("id") == self._initialize_request:
+                self._initialize_result = message.get("result")
+                waiting, self._waiting_for_initialize = self._waiting_for_initialize, []
+        if client:
+            client.connection.write({**message, "id": target[1]})
+        for other, request_id in waiting:
+            other.connection.write({**message, "id": request_id})
+
+    def _on_server_request(self, message: JsonRpcMessage) -> None:
+        assert self._server
+        method = message["method"]
+        params = message.get("params") or {}
+        with self._lock:
+            if method == "client/registerCapability":
+                for registration in params.get("registrations", []):
+                    self._registrations[registration["id"]] = registration
+            elif method == "client/unregisterCapability":
+                for registration in params.get("unregisterations", []):
+                    self._registrations.pop(registration["id"], None)
+            if method in _BROADCAST_REQUESTS:
+                clients = [client for client in self._clients.values() if client.initialized]
+            elif method == "workspace/configuration":
+                items = params.get("items") or [{}]
+                clients = self._clients_for_uri(items[0].get("scopeUri"))[:1]
+            else:
+                clients = self._active_clients()
+        if not clients:
+            self._server.write({"jsonrpc": "2.0", "id": message["id"], "result": None})
+            return
+        self._request_clients(clients, method, message.get("params"), message["id"])
+
+    def _notification_clients(self, message: JsonRpcMessage) -> list[_Client]:
+        with self._lock:
+            if message["method"] == "textDocument/publishDiagnostics":
+                return self._clients_for_uri(message["params"]["uri"])
+            if message["method"] in _ACTIVE_CLIENT_NOTIFICATIONS:
+                return self._active_clients()
+            return list(self._clients.values())
+
+    def _send_to_clients(self, clients: list[_Client], message: JsonRpcMessage) -> None:
+        for client in clients:
+            client.connection.write(message)
+
+    def _request_clients(
+        self, clients: list[_Client], method: str, params: Any, server_id: int | str | None
+    ) -> None:
+        """Sends a request whose first response is forwarded to the server as the response to `server_id`."""
+        request_id = "proxy-{}".format(next(self._ids))
+        with self._lock:
+            self._server_requests[request_id] = _ServerRequest(server_id, {client.id for client in clients})
+        self._send_to_clients(clients, {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+
+    # Routing, call with the lock held
+    ##################################
+
+    def _active_clients(self) -> list[_Client]:
+        client = self._clients.get(self._active_client) if self._active_client is not None else None
+        if client:
+            return [client]
+        return list(self._clients.values())[:1]
+
+    def _clients_for_uri(self, uri: str | None) -> list[_Client]:
+        """The sessions which have the document open or contain it in a workspace folder, else the active one."""
+        if not uri:
+            return self._active_clients()
+        ids = set(self._open_documents.get(uri, []))
+        for client in self._clients.values():
+            if any(uri == f["uri"] or uri.startswith(f["uri"].rstrip("/") + "/") for f in client.folders):
+                ids.add(client.id)
+        clients = [client for client in self._clients.values() if client.id in ids]
+        return clients or self._active_clients()
+
+
+_shared_server: SharedServer | None = None
+_shared_server_lock = threading.Lock()
+
+
+def ensure_shared_server(command: list[str], cwd: str | None) -> tuple[int, str]:
+    """
+    Returns the port and the token of the running shared server and starts it with `command` if there is none.
+    """
+    global _shared_server
+    with _shared_server_lock:
+        if not _shared_server or not _shared_server.is_running():
+            _shared_server = SharedServer(command, cwd)
+            _shared_server.start()
+            print("LSP-jdtls: started the shared server on port {}".format(_shared_server.port))
+        return _shared_server.port, _shared_server.token
+
+
+def replace_shared_server() -> None:
+    """
+    Makes the next session start a new shared server, e.g. with a different command.
+    The running one stops once all its sessions disconnected.
+    """
+    global _shared_server
+    with _shared_server_lock:
+        _shared_server = None
+
+
+def stop_shared_server() -> None:
+    global _shared_server
+    with _shared_server_lock:
+        if _shared_server:
+            _shared_server.stop()
+            _shared_server = None
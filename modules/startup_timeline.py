@@ -0,0 +1,221 @@
+"""
+Records how long the phases of a server start take, per window.
+
+The phases before a window is known (the install check and the installation) are kept per thread until the
+next `begin` in the same thread, LSP runs them right before the `on_pre_start` of their window.
+A timeline is finished once the server reported ServiceReady and published its first diagnostics, or as
+incomplete when its session ends earlier. It is appended to a JSON lines log, which keeps the history
+of the last starts for spotting regressions.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, TypedDict
+
+from . import installer
+
+LOG_FILENAME = "startup_timeline.jsonl"
+MAX_HISTORY = 100
+MAX_PENDING_AGE = 600
+"""Seconds after which phases recorded before a window was known are no longer attributed to a start."""
+READY = "language/status ServiceReady"
+FIRST_DIAGNOSTICS = "first diagnostics"
+
+
+class Phase(TypedDict):
+    name: str
+    start: float
+    """Seconds since the start of the timeline."""
+    duration: float
+    """Seconds, 0 for milestones."""
+
+
+class TimelineRecord(TypedDict):
+    started: float
+    """Unix timestamp of the start."""
+    folders: list[str]
+    total: float
+    complete: bool
+    """False if the session ended before the server was ready."""
+    phases: list[Phase]
+
+
+_lock = threading.Lock()
+_pending: dict[int, list[tuple[str, float, float]]] = {}
+"""Phases recorded before the start of a window by thread, with absolute start times."""
+_timelines: dict[int, StartupTimeline] = {}
+_last: dict[int, TimelineRecord] = {}
+
+
+def log_path() -> str:
+    return os.path.join(installer.storage_subpath(), LOG_FILENAME)
+
+
+class StartupTimeline:
+    def __init__(self, folders: list[str]) -> None:
+        self._folders = folders
+        self._phases: list[tuple[str, float, float]] = []
+        self._marked: set[str] = set()
+        self.finished = False
+        with _lock:
+            pending = _pending.pop(threading.get_ident(), [])
+            self._phases += [phase for phase in pending if phase[1] > time.time() - MAX_PENDING_AGE]
+        self._start = min([start for _, start, _ in self._phases] + [time.time()])
+
+    def mark(self, name: str) -> None:
+        """Records the first occurrence of a milestone."""
+        if self.finished or name in self._marked:
+            return
+        self._marked.add(name)
+        self._phases.append((name, time.time(), 0.0))
+
+    def has(self, name: str) -> bool:
+        return name in self._marked
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.time()
+        try:
+            yield
+        finally:
+            if not self.finished:
+                self._phases.append((name, start, time.time() - start))
+
+    def finish(self, complete: bool) -> TimelineRecord:
+        self.finished = True
+        phases: list[Phase] = [
+            {"name": name, "start": round(start - self._start, 3), "duration": round(duration, 3)}
+            for name, start, duration in sorted(self._phases, key=lambda phase: phase[1])
+        ]
+        end = max([start + duration for _, start, duration in self._phases] + [self._start])
+        record: TimelineRecord = {
+            "started": self._start,
+            "folders": self._folders,
+            "total": round(end - self._start, 3),
+            "complete": complete,
+            "phases": phases,
+        }
+        _append_to_log(record)
+        return record
+
+
+@contextmanager
+def pending_phase(name: str, first: bool = False) -> Iterator[None]:
+    """
+    Times a phase which happens before the window of the start is known. The `first` phase of a start drops
+    the phases of an earlier start in the thread which did not get to a window, as does a failing phase.
+    """
+    thread = threading.get_ident()
+    if first:
+        with _lock:
+            _pending.pop(thread, None)
+    start = time.time()
+    try:
+        yield
+    except BaseException:
+        with _lock:
+            _pending.pop(thread, None)
+        raise
+    with _lock:
+        _pending.setdefault(thread, []).append((name, start, time.time() - start))
+
+
+def begin(window_id: int, folders: list[str]) -> StartupTimeline:
+    finish(window_id, complete=False)
+    timeline = StartupTimeline(folders)
+    _timelines[window_id] = timeline
+    return timeline
+
+
+def get(window_id: int) -> StartupTimeline | None:
+    timeline = _timelines.get(window_id)
+    return timeline if timeline and not timeline.finished else None
+
+
+def mark(window_id: int, name: str) -> None:
+    """Records a milestone of the start in `window_id` and finishes the timeline once the server is ready."""
+    timeline = get(window_id)
+    if not timeline:
+        return
+    timeline.mark(name)
+    if timeline.has(READY) and timeline.has(FIRST_DIAGNOSTICS):
+        finish(window_id)
+
+
+def finish(window_id: int, complete: bool = True, timeline: StartupTimeline | None = None) -> None:
+    """Finishes the running timeline of `window_id`, if `timeline` is given only if it is that one."""
+    current = _timelines.get(window_id)
+    if not current or (timeline and current is not timeline):
+        return
+    timeline = _timelines.pop(window_id)
+    if not timeline.finished:
+        record = timeline.finish(complete)
+        _last[window_id] = record
+        print("LSP-jdtls: server started in {:.1f}s{}".format(record["total"], "" if complete else " (incomplete)"))
+
+
+def last(window_id: int) -> TimelineRecord | None:
+    return _last.get(window_id)
+
+
+def history() -> list[TimelineRecord]:
+    """The recorded starts, oldest first. Lines which cannot be read, e.g. of an interrupted write, are skipped."""
+    records = []
+    try:
+        with open(log_path(), "r") as log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict):
+                    records.append(record)
+    except OSError:
+        pass
+    return records
+
+
+def _append_to_log(record: TimelineRecord) -> None:
+    with _lock:
+        records = history()[-(MAX_HISTORY - 1):] + [record]
+        os.makedirs(os.path.dirname(log_path()), exist_ok=True)
+        with open(log_path() + ".tmp", "w") as log:
+            for entry in records:
+                log.write(json.dumps(entry) + "\n")
+        os.replace(log_path() + ".tmp", log_path())
+
+
+def format_report(latest: TimelineRecord | None, records: list[TimelineRecord]) -> str:
+    lines = []
+    if latest:
+        lines.append("Last start of this window: {:.1f}s{}".format(
+            latest["total"], "" if latest["complete"] else " (incomplete)"
+        ))
+        lines.append("")
+        for phase in latest["phases"]:
+            duration = "{:8.2f}s".format(phase["duration"]) if phase["duration"] else " " * 9
+            lines.append("  {:8.2f}s {} {}".format(phase["start"], duration, phase["name"]))
+        lines.append("")
+    durations = sorted(record["total"] for record in records if record["complete"])
+    if durations:
+        median = durations[len(durations) // 2]
+        lines.append("Median of the last {} complete starts: {:.1f}s".format(len(durations), median))
+        lines.append("")
+    lines.append("History (oldest first):")
+    lines.append("")
+    for record in records:
+        lines.append("  {}  {:7.1f}s{}  {}".format(
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(record["started"])),
+            record["total"],
+            " " if record["complete"] else "*",
+            ", ".join(record["folders"]),
+        ))
+    if any(not record["complete"] for record in records):
+        lines.append("")
+        lines.append("  * the session ended before the server was ready")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,73 @@
+"""
+The syntax server of the hybrid launch mode.
+
+With "java.server.launchMode" set to "Hybrid", a syntax server is started next to the standard server.
+Both serve the open files until the switch, so the mode is opt-in; unset, it is "Standard".
+It only loads the open files, so it provides syntax features like the outline, navigation within the sources
+and syntax errors within seconds. Once the standard server reports ServiceReady, the syntax server is shut down.
+Both sessions get the open documents from LSP, so nothing is lost by the switch.
+With "LightWeight", only the syntax server is started.
+"""
+
+from __future__ import annotations
+
+import weakref
+from typing import TYPE_CHECKING
+
+from . import jvm_sizing
+
+if TYPE_CHECKING:
+    from LSP.plugin import ClientConfig, Session
+
+LAUNCH_MODE = "java.server.launchMode"
+SYNTAX_SERVER_FLAG = "-Dsyntaxserver=true"
+SYNTAX_SERVER_SIZING = jvm_sizing.JvmSizing(
+    512, 64, ["-XX:+UseParallelGC", "-XX:GCTimeRatio=4", "-XX:AdaptiveSizePolicyWeight=90"]
+)
+"""The syntax server only keeps the open files, a small heap is enough."""
+
+_sessions: dict[int, weakref.ref[Session]] = {}
+_standard_server_ready: set[int] = set()
+
+
+def launch_mode(configuration: ClientConfig) -> str:
+    return configuration.settings.get(LAUNCH_MODE) or "Standard"
+
+
+def is_needed(window_id: int, configuration: ClientConfig) -> bool:
+    mode = launch_mode(configuration)
+    return mode == "LightWeight" or (mode == "Hybrid" and window_id not in _standard_server_ready)
+
+
+def configure_command(command: list[str], data_path: str | None) -> None:
+    """Turns the command of the standard server into the one of the syntax server."""
+    if SYNTAX_SERVER_FLAG not in command:
+        command.insert(command.index("-jar"), SYNTAX_SERVER_FLAG)
+    if data_path and "-data" in command:
+        command[command.index("-data") + 1] = data_path
+    jvm_sizing.apply_sizing(command, SYNTAX_SERVER_SIZING)
+
+
+def register_session(session: Session) -> None:
+    """Ends the syntax session right away if the standard server got ready while it was initializing."""
+    window_id = session.window.id()
+    if window_id in _standard_server_ready and launch_mode(session.config) == "Hybrid":
+        print("LSP-jdtls: the standard server is already ready, shutting down the syntax server")
+        session.end_async()
+        return
+    _sessions[window_id] = weakref.ref(session)
+
+
+def standard_server_starting(window_id: int) -> None:
+    """A new standard server needs the syntax server again until it is ready."""
+    _standard_server_ready.discard(window_id)
+
+
+def standard_server_ready(window_id: int) -> None:
+    """Shuts down the syntax server of the window, the standard server takes over."""
+    _standard_server_ready.add(window_id)
+    ref = _sessions.pop(window_id, None)
+    session = ref() if ref else None
+    if session and launch_mode(session.config) == "Hybrid":
+        print("LSP-jdtls: the standard server is ready, shutting down the syntax server")
+        session.end_async()
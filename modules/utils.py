@@ -9,6 +9,8 @@ from typing_extensions import override
 from .constants import SESSION_NAME, SETTINGS_FILENAME
 
 if TYPE_CHECKING:
+    from weakref import ref
+
     from .text_extension_protocol import IJavaTestItem
 
 
@@ -105,14 +107,40 @@ def add_request_handler(request: str, handler: Callable[[Session, Any, int], Non
     return decorator
 
 
-def view_for_uri_async(session: Session, uri: str | None) -> sublime.View | None:
-    """Returns a view matching the uri that is attached to the given session.
-    Only safe to use in the async thread.
+class SessionViewIndex:
+    """Maps the uris of the views attached to a session to the views.
+    The index is rebuilt in one pass over the views on the first lookup after `invalidate`,
+    which has to be called whenever a view is attached or detached, and when the indexed view was closed,
+    e.g. one of several clones of a document. Only safe to use in the async thread.
     """
-    for view_protocol in session.session_views_async():
-        if view_protocol.get_uri() == uri:
-            return view_protocol.view
-    return None
+
+    def __init__(self, weaksession: ref[Session]) -> None:
+        self._weaksession = weaksession
+        self._views: dict[str, sublime.View] = {}
+        self._dirty = True
+
+    def invalidate(self) -> None:
+        self._dirty = True
+
+    def view_for_uri(self, uri: str | None) -> sublime.View | None:
+        if not uri:
+            return None
+        if not self._dirty:
+            view = self._views.get(uri)
+            if not view or view.is_valid():
+                return view
+        self._rebuild()
+        view = self._views.get(uri)
+        return view if view and view.is_valid() else None
+
+    def _rebuild(self) -> None:
+        session = self._weaksession()
+        self._views = {}
+        if session:
+            for view_protocol in session.session_views_async():
+                if view_protocol.view.is_valid():
+                    self._views[view_protocol.get_uri()] = view_protocol.view
+        self._dirty = False
 
 
 class LspJdtlsTextCommand(LspTextCommand):
@@ -0,0 +1,133 @@
+"""
+Answers the `workspace/configuration` sections which come from the settings of a view, e.g. the indentation.
+
+jdtls asks again for every formatting operation, so the answers are memoized per session by section and scope.
+An entry is dropped when the settings of its view change, all entries when the global preferences change
+or a view is attached or detached. A value read while an invalidation happened in the main thread is not stored.
+"""
+
+from __future__ import annotations
+
+import threading
+import weakref
+from typing import TYPE_CHECKING, Any
+
+import sublime
+
+from .constants import JDTLS_CONFIG_TO_SUBLIME_SETTING
+from .utils import SessionViewIndex
+
+if TYPE_CHECKING:
+    from weakref import ref
+
+    from LSP.plugin import Session
+    from LSP.protocol import ConfigurationItem
+
+PREFERENCES_ON_CHANGE_KEY = "LSP-jdtls-workspace-configuration"
+PREFERENCES = ["Preferences.sublime-settings", "Java.sublime-settings"]
+"""The settings files the view settings fall back to."""
+
+_instances: weakref.WeakSet[WorkspaceConfiguration] = weakref.WeakSet()
+_NOT_FOUND = object()
+
+
+class WorkspaceConfiguration:
+    """Only safe to use in the async thread, except for the invalidation."""
+
+    def __init__(self, weaksession: ref[Session]) -> None:
+        self._view_index = SessionViewIndex(weaksession)
+        self._values: dict[tuple[str, str], Any] = {}
+        self._keys_by_view: dict[int, set[tuple[str, str]]] = {}
+        """The cached entries by the view their value was read from, for invalidating them when it changes."""
+        self._watched_views: dict[int, sublime.View] = {}
+        """The views with a settings listener."""
+        self._generation = 0
+        """Counts the invalidations."""
+        self._lock = threading.Lock()
+        """Guards the entries against an invalidation in the main thread while a value is stored."""
+        self._on_change_key = f"LSP-jdtls-workspace-configuration-{id(self)}"
+        _instances.add(self)
+
+    def resolve(self, params: ConfigurationItem, configuration: Any) -> Any:
+        """The value of the section of `params`, or `configuration` if it does not come from a view."""
+        section = params.get("section")
+        scope = params.get("scopeUri")
+        if not section or not scope or section not in JDTLS_CONFIG_TO_SUBLIME_SETTING:
+            return configuration
+        key = (section, scope)
+        value = self._values.get(key, _NOT_FOUND)
+        if value is not _NOT_FOUND:
+            return value
+        view = self._view_index.view_for_uri(scope)
+        if not view:
+            return configuration
+        view_id = view.id()
+        if view_id not in self._watched_views:
+            # Watched before reading, so a change right after the read invalidates the value.
+            weakself = weakref.ref(self)
+
+            def on_change() -> None:
+                instance = weakself()
+                if instance:
+                    instance._invalidate_view(view_id)
+
+            view.settings().add_on_change(self._on_change_key, on_change)
+            self._watched_views[view_id] = view
+        generation = self._generation
+        setting, convert = JDTLS_CONFIG_TO_SUBLIME_SETTING[section]
+        value = view.settings().get(setting, None)
+        if value is not None:
+            value = convert(value)
+        with self._lock:
+            if generation == self._generation:
+                self._values[key] = value
+                self._keys_by_view.setdefault(view_id, set()).add(key)
+        return value
+
+    def views_changed(self) -> None:
+        """
+        Called when a view is attached or detached, the uris of the views may have changed.
+        The listeners are removed, they are added again for the views which are still asked for.
+        """
+        self._view_index.invalidate()
+        self._unwatch_views()
+        self.invalidate()
+
+    def close(self) -> None:
+        """Removes the listeners, called when the session ends."""
+        self._unwatch_views()
+        self.invalidate()
+        _instances.discard(self)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._values = {}
+            self._keys_by_view = {}
+
+    def _unwatch_views(self) -> None:
+        watched, self._watched_views = self._watched_views, {}
+        for view in watched.values():
+            view.settings().clear_on_change(self._on_change_key)
+
+    def _invalidate_view(self, view_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in self._keys_by_view.pop(view_id, ()):
+                self._values.pop(key, None)
+
+
+def invalidate_all() -> None:
+    """Drops the answers of all sessions, e.g. after a change of the global preferences."""
+    for instance in list(_instances):
+        instance.invalidate()
+
+
+def watch_preferences() -> None:
+    for preferences in PREFERENCES:
+        sublime.load_settings(preferences).add_on_change(PREFERENCES_ON_CHANGE_KEY, invalidate_all)
+
+
+def unwatch_preferences() -> None:
+    for preferences in PREFERENCES:
+        sublime.load_settings(preferences).clear_on_change(PREFERENCES_ON_CHANGE_KEY)
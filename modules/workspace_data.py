@@ -0,0 +1,246 @@
+"""
+Per-workspace jdtls data directories.
+
+Every set of workspace folders gets its own Eclipse workspace below the data directory, named by a hash
+of the folders, so switching projects or opening several windows keeps each index warm. The syntax server
+keeps its workspaces in a subdirectory of the data directory.
+The directories are tracked in an index and the least recently used ones are evicted
+once all of them together exceed "workspaceData.maxSizeMB". Their sizes are measured in the background
+when a server releases its directory, so acquiring one never walks the others.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import threading
+import time
+from typing import TypedDict
+
+import sublime
+
+from . import worktree_seed
+from .constants import SETTINGS_FILENAME, SYNTAX_SERVER_DATA_DIR, WORKSPACE_DATA_MAX_SIZE_MB
+
+INDEX_FILENAME = "workspaces.json"
+LOCK_FILE = os.path.join(".metadata", ".lock")
+"""Locked by a running jdtls for the whole lifetime of the server."""
+
+
+class WorkspaceEntry(TypedDict):
+    """An entry of the index, keyed by the path of the directory relative to the data directory."""
+    folders: list[str]
+    last_used: float
+    size: int
+    """Size in bytes when the entry was last measured."""
+
+
+_lock = threading.Lock()
+
+
+def workspace_key(folders: list[str]) -> str:
+    normalized = sorted(os.path.normcase(os.path.abspath(folder)) for folder in folders)
+    return hashlib.sha256("\n".join(normalized).encode()).hexdigest()[:16]
+
+
+def syntax_server_key(key: str) -> str:
+    """The key of the data directory of the syntax server for the workspace `key`."""
+    return f"{SYNTAX_SERVER_DATA_DIR}/{key}"
+
+
+def acquire(root: str, folders: list[str], key: str | None = None) -> str:
+    """
+    Returns the data directory for `folders`, or the one named `key`, marks it as used
+    and evicts least recently used directories of other workspaces which are not in use.
+    A new data directory is seeded from another worktree of the same git repository, if there is one.
+    """
+    key = key or workspace_key(folders)
+    with _lock:
+        os.makedirs(root, exist_ok=True)
+        index = _load_index(root)
+        # The syntax server has no use for the index of the standard server.
+        _migrate_legacy_workspace(root, index, workspace_key(folders) if _is_syntax_server_key(key) else key, folders)
+        if not os.path.isdir(_path(root, key)) and sublime.load_settings(SETTINGS_FILENAME).get(
+            "workspaceData.seedFromWorktrees"
+        ):
+            _seed_from_worktree(root, index, key, folders)
+        index[key] = {"folders": folders, "last_used": time.time(), "size": index.get(key, {}).get("size", 0)}
+        _evict(root, index, key)
+        _save_index(root, index)
+    return _path(root, key)
+
+
+def release(path: str) -> None:
+    """Records the size of the data directory `path` in a background thread, after its server ended."""
+    threading.Thread(target=_record_size, args=(path,), name="LSP-jdtls workspace size", daemon=True).start()
+
+
+def _record_size(path: str) -> None:
+    size = _directory_size(path)
+    parent, key = os.path.split(path)
+    root = parent
+    if os.path.basename(parent) == SYNTAX_SERVER_DATA_DIR:
+        root, key = os.path.dirname(parent), syntax_server_key(key)
+    with _lock:
+        index = _load_index(root)
+        if key in index:
+            index[key]["size"] = size
+            _save_index(root, index)
+
+
+def clear(root: str, folders: list[str], key: str | None = None) -> bool:
+    """
+    Removes the data directory of `folders`, or the one named `key`, and the one of the syntax server for `folders`.
+    Returns whether there was one.
+    """
+    keys = [key or workspace_key(folders), syntax_server_key(workspace_key(folders))]
+    cleared = False
+    with _lock:
+        index = _load_index(root)
+        removed = [index.pop(name, None) for name in keys]
+        if any(removed):
+            _save_index(root, index)
+        for name in keys:
+            path = _path(root, name)
+            if os.path.exists(path):
+                shutil.rmtree(path, onerror=_del_rw)
+                cleared = True
+    return cleared
+
+
+def _seed_from_worktree(root: str, index: dict[str, WorkspaceEntry], key: str, folders: list[str]) -> None:
+    """
+    Copies the data directory of the most recently used other worktree of the same repository.
+    Directories of running servers are skipped, their content may change while it is copied.
+    """
+    for source_key, entry in sorted(index.items(), key=lambda item: item[1]["last_used"], reverse=True):
+        source = _path(root, source_key)
+        same_server = _is_syntax_server_key(source_key) == _is_syntax_server_key(key)
+        if source_key == key or not same_server or not os.path.isdir(source):
+            continue
+        mapping = worktree_seed.path_mapping(entry["folders"], folders)
+        if not mapping or _is_in_use(source):
+            continue
+        print("LSP-jdtls: seeding the server data from the worktree {}".format(", ".join(mapping)))
+        try:
+            worktree_seed.seed(source, _path(root, key), mapping)
+        except OSError as e:
+            print(f"LSP-jdtls: seeding the server data failed: {e}")
+        return
+
+
+def _max_size() -> int:
+    max_size_mb = sublime.load_settings(SETTINGS_FILENAME).get("workspaceData.maxSizeMB")
+    if max_size_mb is None:
+        max_size_mb = WORKSPACE_DATA_MAX_SIZE_MB
+    return max_size_mb * 1024 * 1024
+
+
+def _evict(root: str, index: dict[str, WorkspaceEntry], current: str) -> None:
+    total = sum(entry["size"] for entry in index.values())
+    max_size = _max_size()
+    for key, entry in sorted(index.items(), key=lambda item: item[1]["last_used"]):
+        if total <= max_size:
+            break
+        path = _path(root, key)
+        if key == current or _is_in_use(path):
+            continue
+        server = "syntax server" if _is_syntax_server_key(key) else "server"
+        print("LSP-jdtls: evicting the unused {} data of {}".format(server, ", ".join(entry["folders"]) or path))
+        shutil.rmtree(path, ignore_errors=True)
+        del index[key]
+        total -= entry["size"]
+
+
+def _migrate_legacy_workspace(root: str, index: dict[str, WorkspaceEntry], key: str, folders: list[str]) -> None:
+    """
+    Moves the single data directory shared by all workspaces of earlier versions to the one of `key`,
+    so the first workspace opened after the update keeps its index. It is removed if `key` has one already.
+    """
+    if not os.path.isdir(os.path.join(root, ".metadata")) or _is_in_use(root):
+        return
+    target = _path(root, key)
+    migrate = not os.path.exists(target)
+    if migrate:
+        print(f"LSP-jdtls: moving the server data of earlier versions to {target}")
+        os.makedirs(target)
+        index.setdefault(key, {"folders": folders, "last_used": time.time(), "size": 0})
+    tracked = {name.split("/")[0] for name in [*index, key]}
+    for name in os.listdir(root):
+        if name in tracked or name in (INDEX_FILENAME, SYNTAX_SERVER_DATA_DIR):
+            continue
+        path = os.path.join(root, name)
+        if migrate:
+            os.replace(path, os.path.join(target, name))
+        elif os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+    if migrate:
+        # Its size is only known once it is measured.
+        release(target)
+
+
+def _path(root: str, key: str) -> str:
+    return os.path.join(root, *key.split("/"))
+
+
+def _is_syntax_server_key(key: str) -> bool:
+    return key.startswith(f"{SYNTAX_SERVER_DATA_DIR}/")
+
+
+def _is_in_use(path: str) -> bool:
+    """Whether a running server, possibly of another Sublime Text instance, holds the workspace lock."""
+    lock_file = os.path.join(path, LOCK_FILE)
+    if not os.path.exists(lock_file):
+        return False
+    try:
+        with open(lock_file, "a") as file:
+            if sys.platform == "win32":
+                import msvcrt
+
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.lockf(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.lockf(file.fileno(), fcntl.LOCK_UN)
+    except OSError:
+        return True
+    return False
+
+
+def _directory_size(path: str) -> int:
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def _del_rw(function, path, exc_info) -> None:
+    os.chmod(path, stat.S_IWRITE)
+    function(path)
+
+
+def _load_index(root: str) -> dict[str, WorkspaceEntry]:
+    try:
+        with open(os.path.join(root, INDEX_FILENAME), "r") as index:
+            return json.load(index)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(root: str, index: dict[str, WorkspaceEntry]) -> None:
+    index_file = os.path.join(root, INDEX_FILENAME)
+    with open(index_file + ".tmp", "w") as file:
+        json.dump(index, file)
+    os.replace(index_file + ".tmp", index_file)
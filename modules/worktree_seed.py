@@ -0,0 +1,154 @@
+"""
+Seeds the data directory of a new workspace with a copy of the one of another git worktree of the same repository,
+so the server starts from a warm index and only has to catch up with the differences between the checkouts.
+
+Absolute paths of the source worktree are rewritten to the new one in the project locations of the Eclipse workspace
+and in its text metadata. Binary indexes mostly use workspace relative paths and are refreshed by the server.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import struct
+import tempfile
+from typing import Callable
+from urllib.parse import quote
+
+LOCATION_FILE = ".location"
+LOCATION_CHUNK_SIZE = 16
+"""Eclipse wraps a `.location` file in 16 byte begin and end markers."""
+MAX_TEXT_FILE_SIZE = 1024 * 1024
+TEXT_FILE_SUFFIXES = (".prefs", ".xml", ".json", ".properties", ".txt", ".classpath", ".project", ".launch")
+SKIPPED_FILES = {".lock", ".log"}
+"""Files of the running server which must not be copied."""
+
+
+def worktree_root(folder: str) -> str | None:
+    """The root of the git checkout which contains `folder`."""
+    path = os.path.abspath(folder)
+    while True:
+        if os.path.exists(os.path.join(path, ".git")):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def git_common_dir(root: str) -> str | None:
+    """
+    The git directory shared by all worktrees of the repository of the checkout in `root`.
+    Linked worktrees have a `.git` file pointing to their own git directory, which names the common one.
+    """
+    dot_git = os.path.join(root, ".git")
+    if os.path.isdir(dot_git):
+        return os.path.normcase(os.path.realpath(dot_git))
+    try:
+        with open(dot_git, "r") as file:
+            gitdir = file.read().strip()
+        if not gitdir.startswith("gitdir:"):
+            return None
+        gitdir = os.path.join(root, gitdir[len("gitdir:"):].strip())
+        with open(os.path.join(gitdir, "commondir"), "r") as file:
+            return os.path.normcase(os.path.realpath(os.path.join(gitdir, file.read().strip())))
+    except OSError:
+        return None
+
+
+def _relative_folders(folders: list[str]) -> dict[str, str] | None:
+    """Maps the paths of `folders` relative to their worktree root to that root."""
+    relative_folders: dict[str, str] = {}
+    for folder in folders:
+        root = worktree_root(folder)
+        if not root:
+            return None
+        relative_folders[os.path.relpath(os.path.abspath(folder), root)] = root
+    return relative_folders
+
+
+def path_mapping(source_folders: list[str], target_folders: list[str]) -> dict[str, str] | None:
+    """
+    Maps the worktree roots of `source_folders` to the ones of `target_folders`,
+    if both are the same folders of different worktrees of the same repository.
+    """
+    source = _relative_folders(source_folders)
+    target = _relative_folders(target_folders)
+    if not source or not target or source.keys() != target.keys():
+        return None
+    mapping: dict[str, str] = {}
+    for relative, source_root in source.items():
+        target_root = target[relative]
+        common_dir = git_common_dir(source_root)
+        if source_root == target_root or not common_dir or common_dir != git_common_dir(target_root):
+            return None
+        mapping[source_root] = target_root
+    return mapping
+
+
+def seed(source: str, target: str, mapping: dict[str, str]) -> None:
+    """Copies the data directory `source` to `target` and rewrites the paths of `mapping` in it."""
+    parent = os.path.dirname(target)
+    staging = tempfile.mkdtemp(prefix=".seeding-", dir=parent)
+    try:
+        copy = os.path.join(staging, "data")
+        shutil.copytree(source, copy, ignore=lambda _, names: [name for name in names if name in SKIPPED_FILES])
+        replace = _replacer(mapping)
+        for dirpath, _, filenames in os.walk(copy):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename == LOCATION_FILE:
+                    _rewrite_location(path, replace)
+                elif filename.endswith(TEXT_FILE_SUFFIXES) and os.path.getsize(path) <= MAX_TEXT_FILE_SIZE:
+                    _rewrite_text(path, replace)
+        os.rename(copy, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _replacer(mapping: dict[str, str]) -> Callable[[str], str]:
+    """Replaces the source paths with the target paths, as plain paths, with forward slashes and url quoted."""
+    variants: dict[str, str] = {}
+    for source, target in mapping.items():
+        variants[source] = target
+        variants[source.replace(os.sep, "/")] = target.replace(os.sep, "/")
+        variants[quote(source.replace(os.sep, "/"))] = quote(target.replace(os.sep, "/"))
+    # Longest first, so nested worktrees are not replaced by their parent. A path must not continue after the match.
+    pattern = re.compile(
+        "(?:{})(?![\\w.-])".format("|".join(re.escape(variant) for variant in sorted(variants, key=len, reverse=True)))
+    )
+
+    def replace(text: str) -> str:
+        return pattern.sub(lambda match: variants[match.group(0)], text)
+
+    return replace
+
+
+def _rewrite_location(path: str, replace: Callable[[str], str]) -> None:
+    """Rewrites the project location uri, which is stored with Java's `DataOutput.writeUTF` after the begin marker."""
+    with open(path, "rb") as file:
+        content = file.read()
+    offset = LOCATION_CHUNK_SIZE
+    if len(content) < offset + 2:
+        return
+    (length,) = struct.unpack(">H", content[offset:offset + 2])
+    try:
+        location = content[offset + 2:offset + 2 + length].decode("utf-8")
+    except UnicodeDecodeError:
+        return
+    encoded = replace(location).encode("utf-8")
+    with open(path, "wb") as file:
+        file.write(content[:offset] + struct.pack(">H", len(encoded)) + encoded + content[offset + 2 + length:])
+
+
+def _rewrite_text(path: str, replace: Callable[[str], str]) -> None:
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            text = file.read()
+    except (OSError, UnicodeDecodeError):
+        return
+    rewritten = replace(text)
+    if rewritten != text:
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            file.write(rewritten)
@@ -0,0 +1,60 @@
+"""
+A stand-in for jdtls on stdio, for the tests of the shared server.
+
+It answers `initialize`, `shutdown` and `test/echo`, and `test/received` with all messages it received before.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from typing import Any, Dict
+
+JsonRpcMessage = Dict[str, Any]
+
+
+def read(stream: Any) -> JsonRpcMessage | None:
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.decode("ascii").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    if length is None:
+        return None
+    return json.loads(stream.read(length).decode("utf-8"))
+
+
+def write(stream: Any, message: JsonRpcMessage) -> None:
+    body = json.dumps(message).encode("utf-8")
+    stream.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    stream.flush()
+
+
+def main() -> None:
+    received: list[JsonRpcMessage] = []
+    while True:
+        message = read(sys.stdin.buffer)
+        if message is None or message.get("method") == "exit":
+            return
+        method = message.get("method")
+        if method == "initialize":
+            result: Any = {"capabilities": {"textDocumentSync": 2}}
+        elif method == "test/echo":
+            result = message.get("params")
+        elif method == "test/received":
+            result = list(received)
+        else:
+            result = None
+        received.append(message)
+        if method and "id" in message:
+            write(sys.stdout.buffer, {"jsonrpc": "2.0", "id": message["id"], "result": result})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Micro-benchmarks of hot paths, with stand-ins for the sessions and views of LSP.
+
+They print their timings and only fail if the optimized path is not clearly faster, or does more work than expected.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+import weakref
+from typing import Any, Callable
+from unittest import TestCase
+
+from ..modules.jdtls import EclipseJavaDevelopmentTools
+from ..modules.utils import SessionViewIndex
+
+VIEWS = 1000
+OPENS = 100
+DECOMPILE_SECONDS = 0.2
+CLASS_URI = "jdt://contents/missing.jar/org.example/Example.class?=project/%5C/missing.jar%3Corg.example%28Example.class"
+
+
+class _View:
+    def is_valid(self) -> bool:
+        return True
+
+
+class _SessionView:
+    def __init__(self, uri: str) -> None:
+        self.view = _View()
+        self._uri = uri
+
+    def get_uri(self) -> str:
+        return self._uri
+
+
+class _Session:
+    def __init__(self, uris: list[str]) -> None:
+        self._session_views = [_SessionView(uri) for uri in uris]
+
+    def session_views_async(self) -> list[_SessionView]:
+        return self._session_views
+
+
+class _Window:
+    def id(self) -> int:
+        # No real window has it, so no startup timeline is touched.
+        return -1
+
+
+class _Config:
+    def __init__(self) -> None:
+        self.settings: dict[str, Any] = {}
+        self.command: list[str] = []
+
+
+class _DecompilingSession:
+    """Answers `java/classFileContents` after `DECOMPILE_SECONDS`, the answers are run by the test."""
+
+    def __init__(self) -> None:
+        self.window = _Window()
+        self.config = _Config()
+        self.requests = 0
+        self.answers: queue.Queue[Callable[[], None]] = queue.Queue()
+
+    def send_request_async(self, request: Any, on_result: Callable[[str], None], on_error: Any) -> int:
+        self.requests += 1
+        timer = threading.Timer(DECOMPILE_SECONDS, self.answers.put, [lambda: on_result("class Example {}")])
+        timer.start()
+        return self.requests
+
+
+def _report(name: str, naive: float, optimized: float) -> None:
+    print(f"{name}: {naive:.4f}s naive, {optimized:.4f}s optimized, {naive / max(optimized, 1e-9):.0f}x")
+
+
+class SessionViewIndexBenchmark(TestCase):
+    def test_configuration_items(self) -> None:
+        """Resolves a `workspace/configuration` request with an item for every view."""
+        uris = [f"file:///project/src/Class{i}.java" for i in range(VIEWS)]
+        session = _Session(uris)
+
+        def linear(uri: str) -> Any:
+            for session_view in session.session_views_async():
+                if session_view.view.is_valid() and session_view.get_uri() == uri:
+                    return session_view.view
+            return None
+
+        start = time.perf_counter()
+        expected = [linear(uri) for uri in uris]
+        naive = time.perf_counter() - start
+
+        index = SessionViewIndex(weakref.ref(session))  # type: ignore[arg-type]
+        start = time.perf_counter()
+        views = [index.view_for_uri(uri) for uri in uris]
+        optimized = time.perf_counter() - start
+
+        _report(f"{VIEWS} configuration items for {VIEWS} views", naive, optimized)
+        self.assertEqual(views, expected)
+        self.assertLess(optimized * 5, naive)
+
+
+class ClassFileOpenBenchmark(TestCase):
+    def test_parallel_opens(self) -> None:
+        """Opens the same `jdt:` document in parallel, e.g. from the references of a type, then again."""
+        session = _DecompilingSession()
+        plugin = EclipseJavaDevelopmentTools(weakref.ref(session))  # type: ignore[arg-type]
+        opened: list[tuple[str, str, str]] = []
+
+        def callback(name: str, contents: str, syntax: str) -> None:
+            opened.append((name, contents, syntax))
+
+        start = time.perf_counter()
+        for _ in range(OPENS):
+            plugin.on_open_uri_async(CLASS_URI, callback)
+        session.answers.get(timeout=10)()
+        first = time.perf_counter() - start
+        self.assertEqual(session.requests, 1)
+        self.assertEqual(len(opened), OPENS)
+
+        start = time.perf_counter()
+        for _ in range(OPENS):
+            plugin.on_open_uri_async(CLASS_URI, callback)
+        second = time.perf_counter() - start
+
+        print(f"{OPENS} parallel opens of a class: {session.requests} request, {first:.4f}s")
+        print(f"{OPENS} opens of the class from memory: {second:.4f}s")
+        self.assertEqual(session.requests, 1)
+        self.assertEqual(len(opened), 2 * OPENS)
+        self.assertEqual(plugin.class_file_stats, {"server": 1, "in-flight": OPENS - 1, "memory": OPENS})
+        self.assertLess(first, 2 * DECOMPILE_SECONDS + 1)
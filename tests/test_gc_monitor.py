@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from ..modules.gc_monitor import GcEvent, GcLogTail, HeapPressure, parse_line
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def read_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as file:
+        return file.read()
+
+
+def fixture_events(name: str) -> list[GcEvent]:
+    events = (parse_line(line) for line in read_fixture(name).decode("utf-8").splitlines())
+    return [event for event in events if event]
+
+
+class ParseLineTests(TestCase):
+    def test_young_pause(self) -> None:
+        event = parse_line("[5.004s] GC(4) Pause Young (Normal) (G1 Evacuation Pause) 140M->38M(256M) 11.873ms")
+        self.assertEqual(event, GcEvent(5.004, "Pause Young", 140, 38, 256, 11.873))
+
+    def test_units(self) -> None:
+        event = parse_line("[0.412s] GC(0) Pause Young (Normal) (G1 Evacuation Pause) 9216K->2048K(65536K) 1.830ms")
+        assert event
+        self.assertEqual((event.before_mb, event.after_mb, event.capacity_mb), (9, 2, 64))
+        event = parse_line("[33.002s] GC(9) Pause Young (Prepare Mixed) (G1 Evacuation Pause) 1G->973M(2G) 19.500ms")
+        assert event
+        self.assertEqual((event.before_mb, event.after_mb, event.capacity_mb), (1024, 973, 2048))
+
+    def test_decorators(self) -> None:
+        event = parse_line("[9.240s][info][gc] GC(7) Pause Remark 301M->298M(1G) 8.910ms")
+        self.assertEqual(event, GcEvent(9.24, "Pause Remark", 301, 298, 1024, 8.91))
+
+    def test_other_lines(self) -> None:
+        self.assertIsNone(parse_line("[0.008s] Using G1"))
+        self.assertIsNone(parse_line("[2.870s] GC(3) Concurrent Mark Cycle"))
+        self.assertIsNone(parse_line("[2.911s] GC(3) Concurrent Mark Cycle 40.512ms"))
+        self.assertIsNone(parse_line(""))
+
+    def test_fixture(self) -> None:
+        events = fixture_events("gc.log")
+        self.assertEqual(len(events), 13)
+        self.assertEqual(
+            sorted({event.event for event in events}),
+            ["Pause Cleanup", "Pause Full", "Pause Remark", "Pause Young"],
+        )
+        self.assertEqual(events[-1], GcEvent(35.517, "Pause Young", 1024, 1004, 2048, 25.104))
+
+
+class GcLogTailTests(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "gc.log")
+        self.tail = GcLogTail(self.path)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def write(self, data: bytes) -> None:
+        with open(self.path, "ab") as log:
+            log.write(data)
+
+    def test_missing_log(self) -> None:
+        self.assertEqual(self.tail.read_events(), [])
+
+    def test_incremental(self) -> None:
+        data = read_fixture("gc.log")
+        # Cut within the line of GC(4), which is only parsed once it is complete.
+        cut = data.index(b"GC(4)") + 10
+        self.write(data[:cut])
+        events = self.tail.read_events()
+        self.assertEqual(events, fixture_events("gc.log")[:5])
+        self.assertEqual(self.tail.read_events(), [])
+        self.write(data[cut:])
+        self.assertEqual(events + self.tail.read_events(), fixture_events("gc.log"))
+
+    def test_rotated_log(self) -> None:
+        self.write(read_fixture("gc.log"))
+        self.assertEqual(len(self.tail.read_events()), 13)
+        # The JVM renames the full log to gc.log.0 and starts a new one.
+        os.rename(self.path, self.path + ".0")
+        self.write(read_fixture("gc-rotated.log"))
+        self.assertEqual(self.tail.read_events(), fixture_events("gc-rotated.log"))
+
+
+class HeapPressureTests(TestCase):
+    def test_no_events(self) -> None:
+        self.assertIsNone(HeapPressure(2048).stats())
+
+    def test_stats(self) -> None:
+        events = fixture_events("gc.log")
+        pressure = HeapPressure(4096)
+        pressure.add(events)
+        stats = pressure.stats()
+        assert stats
+        self.assertAlmostEqual(stats.occupancy, 1004 / 4096)
+        self.assertAlmostEqual(stats.gc_ratio, sum(event.pause_ms for event in events) / 1000 / 35.517)
+
+    def test_capacity_without_max_heap(self) -> None:
+        pressure = HeapPressure(None)
+        pressure.add(fixture_events("gc.log"))
+        stats = pressure.stats()
+        assert stats
+        self.assertAlmostEqual(stats.occupancy, 1004 / 2048)
+
+    def test_window(self) -> None:
+        pressure = HeapPressure(2048)
+        pressure.add(fixture_events("gc.log"))
+        pressure.add(fixture_events("gc-rotated.log"))
+        stats = pressure.stats()
+        assert stats
+        # Only the pauses of the last 60 seconds of uptime count.
+        self.assertAlmostEqual(stats.occupancy, 1544 / 2048)
+        self.assertAlmostEqual(stats.gc_ratio, (37.620 + 41.018) / 1000 / 60)
+
+    def test_full_pauses(self) -> None:
+        pressure = HeapPressure(1024)
+        pressure.add([
+            GcEvent(0.5, "Pause Full", 1024, 1024, 1024, 900),
+            GcEvent(1.2, "Pause Full", 1024, 1024, 1024, 700),
+        ])
+        self.assertEqual(pressure.stats(), (1.0, 1.0))
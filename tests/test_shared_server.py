@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import itertools
+import os
+import queue
+import shutil
+import socket
+import sys
+import threading
+from typing import Any
+from unittest import TestCase, skipUnless
+
+from ..modules.shared_server import TOKEN_OPTION, JsonRpcMessage, SharedServer, _Connection
+
+FAKE_SERVER = os.path.join(os.path.dirname(__file__), "fake_language_server.py")
+# The plugin host is no Python interpreter which could run the stand-in server.
+PYTHON = (
+    sys.executable if os.path.basename(sys.executable).startswith("python")
+    else shutil.which("python3") or shutil.which("python")
+)
+TIMEOUT = 10
+URI = "file:///b/src/Example.java"
+
+
+class _Session:
+    """A session connected to the proxy."""
+
+    def __init__(self, port: int) -> None:
+        self.socket = socket.create_connection(("127.0.0.1", port), timeout=TIMEOUT)
+        self.connection = _Connection(self.socket.makefile("rb"), self.socket.makefile("wb"))
+        self.messages: queue.Queue[JsonRpcMessage | None] = queue.Queue()
+        self._ids = itertools.count(100)
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def _read_loop(self) -> None:
+        while True:
+            try:
+                message = self.connection.read()
+            except (OSError, ValueError):
+                message = None
+            self.messages.put(message)
+            if message is None:
+                return
+
+    def close(self) -> None:
+        self.socket.close()
+
+    def notify(self, method: str, params: Any) -> None:
+        self.connection.write({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def send_request(self, method: str, params: Any, request_id: int | None = None) -> int:
+        if request_id is None:
+            request_id = next(self._ids)
+        self.connection.write({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+        return request_id
+
+    def response(self, request_id: int) -> JsonRpcMessage:
+        """Waits for the response to `request_id`, skipping the messages of the server."""
+        while True:
+            message = self.messages.get(timeout=TIMEOUT)
+            if message is None:
+                raise AssertionError(f"the connection was closed before the response to {request_id}")
+            if "method" not in message and message.get("id") == request_id:
+                return message
+
+    def request(self, method: str, params: Any) -> Any:
+        return self.response(self.send_request(method, params))["result"]
+
+    def initialize(self, token: str, folder: str) -> Any:
+        result = self.request("initialize", {
+            "initializationOptions": {TOKEN_OPTION: token},
+            "workspaceFolders": [{"uri": f"file:///{folder}", "name": folder}],
+        })
+        self.notify("initialized", {})
+        return result
+
+    def received(self) -> list[JsonRpcMessage]:
+        """The messages the server received, including all messages this session sent before."""
+        return self.request("test/received", None)
+
+    def is_closed(self) -> bool:
+        while True:
+            message = self.messages.get(timeout=TIMEOUT)
+            if message is None:
+                return True
+
+
+def document_notifications(messages: list[JsonRpcMessage]) -> list[tuple[str, str | None]]:
+    """The document notifications in `messages`, with the text of opened documents."""
+    return [
+        (message["method"], message["params"]["textDocument"].get("text"))
+        for message in messages
+        if message.get("method") in ("textDocument/didOpen", "textDocument/didChange", "textDocument/didClose")
+    ]
+
+
+@skipUnless(PYTHON, "no Python interpreter to run the stand-in server")
+class SharedServerTests(TestCase):
+    def setUp(self) -> None:
+        self.server = SharedServer([PYTHON, FAKE_SERVER], None)  # type: ignore[list-item]
+        self.server.start()
+        self.sessions: list[_Session] = []
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        for session in self.sessions:
+            session.close()
+
+    def connect(self) -> _Session:
+        session = _Session(self.server.port)
+        self.sessions.append(session)
+        return session
+
+    def test_refuses_connections_without_token(self) -> None:
+        session = self.connect()
+        session.send_request("initialize", {"initializationOptions": {TOKEN_OPTION: "0" * 64}})
+        self.assertTrue(session.is_closed())
+        session = self.connect()
+        session.notify("textDocument/didOpen", {"textDocument": {"uri": URI, "languageId": "java", "version": 1}})
+        self.assertTrue(session.is_closed())
+        session = self.connect()
+        self.assertEqual(session.initialize(self.server.token, "a"), {"capabilities": {"textDocumentSync": 2}})
+        received = session.received()
+        self.assertEqual([message["method"] for message in received], ["initialize", "initialized"])
+        # The token is not passed on to the server.
+        self.assertEqual(received[0]["params"]["initializationOptions"], {})
+
+    def test_rewrites_request_ids(self) -> None:
+        first, second = self.connect(), self.connect()
+        first.initialize(self.server.token, "a")
+        second.initialize(self.server.token, "b")
+        first.send_request("test/echo", "first", 7)
+        second.send_request("test/echo", "second", 7)
+        self.assertEqual(first.response(7)["result"], "first")
+        self.assertEqual(second.response(7)["result"], "second")
+        echo_ids = [message["id"] for message in first.received() if message["method"] == "test/echo"]
+        self.assertEqual(len(set(echo_ids)), 2)
+        # The second session gets the initialize result of the first and adds its workspace folder.
+        methods = [message["method"] for message in first.received()]
+        self.assertEqual(methods.count("initialize"), 1)
+        self.assertIn("workspace/didChangeWorkspaceFolders", methods)
+
+    def test_resyncs_documents_changed_in_another_window(self) -> None:
+        owner, other = self.connect(), self.connect()
+        owner.initialize(self.server.token, "a")
+        other.initialize(self.server.token, "b")
+        for session in (owner, other):
+            session.notify("textDocument/didOpen", {
+                "textDocument": {"uri": URI, "languageId": "java", "version": 1, "text": "class Example {}"},
+            })
+            session.received()
+        self.assertEqual(document_notifications(other.received()), [("textDocument/didOpen", "class Example {}")])
+        other.notify("textDocument/didChange", {
+            "textDocument": {"uri": URI, "version": 2},
+            "contentChanges": [{"range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 0}},
+                                "text": "final "}],
+        })
+        self.assertEqual(document_notifications(other.received())[1:], [
+            ("textDocument/didClose", None),
+            ("textDocument/didOpen", "final class Example {}"),
+        ])
+        # Closing it in the window which owns it now brings back the text of the other window.
+        other.notify("textDocument/didClose", {"textDocument": {"uri": URI}})
+        self.assertEqual(document_notifications(other.received())[3:], [
+            ("textDocument/didClose", None),
+            ("textDocument/didOpen", "class Example {}"),
+        ])
+        owner.notify("textDocument/didClose", {"textDocument": {"uri": URI}})
+        self.assertEqual(document_notifications(owner.received())[5:], [("textDocument/didClose", None)])